@@ -6,6 +6,7 @@ import logging
 from typing import Dict, Any
 
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
@@ -25,9 +26,9 @@ router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
 # Initialize voice services
-voice_processor = VoiceProcessor()
 stt_service = STTService()
 tts_service = TTSService()
+voice_processor = VoiceProcessor(stt_service=stt_service, tts_service=tts_service)
 
 
 @router.post("/command", response_model=VoiceCommandResponse)
@@ -102,6 +103,21 @@ async def text_to_speech(
         )
 
 
+@router.post("/tts/stream")
+@limiter.limit("30/minute")
+async def text_to_speech_stream(
+    request: Request,
+    tts_request: TTSRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Convert text to speech, streaming raw audio as it is synthesized"""
+    return StreamingResponse(
+        tts_service.synthesize_speech_stream(tts_request),
+        media_type=tts_service.get_content_type(tts_request.output_format),
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
 @router.post("/upload-audio")
 @limiter.limit("15/minute")
 async def upload_audio_file(
@@ -121,13 +137,9 @@ async def upload_audio_file(
         # Read and process audio data
         audio_content = await file.read()
         
-        # Convert to base64 for processing
-        import base64
-        audio_data = base64.b64encode(audio_content).decode('utf-8')
-        
-        # Process with STT
+        # Process with STT; raw bytes skip the base64 round-trip
         response = await stt_service.transcribe_audio(
-            audio_data=audio_data,
+            audio_data=audio_content,
             sample_rate=16000,  # Default sample rate
             encoding="LINEAR16"
         )
@@ -59,6 +59,14 @@ class Settings:
     # Redis Configuration (for Celery)
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Email transport
+    SMTP_POOL_SIZE: int = 5
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    
+    # User context cache
+    USER_CONTEXT_CACHE_TTL: int = 60  # seconds
+    USER_CONTEXT_CACHE_SIZE: int = 10000
+    
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_WINDOW: int = 60  # seconds
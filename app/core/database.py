@@ -142,7 +142,107 @@ async def create_database_schema():
         CREATE INDEX IF NOT EXISTS idx_task_logs_user_id ON task_logs(user_id);
         CREATE INDEX IF NOT EXISTS idx_task_logs_status ON task_logs(status);
         """,
-        
+
+        """
+        -- Full-text search over memory content and tags
+        -- (array_to_string is only STABLE, so wrap it for the generated column)
+        CREATE OR REPLACE FUNCTION memory_tags_text(tags TEXT[])
+        RETURNS TEXT
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT coalesce(array_to_string(tags, ' '), '')
+        $$;
+
+        ALTER TABLE memories ADD COLUMN IF NOT EXISTS tsv tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('english', content || ' ' || memory_tags_text(tags))
+            ) STORED;
+
+        CREATE INDEX IF NOT EXISTS idx_memories_tsv ON memories USING GIN(tsv);
+        """,
+
+        """
+        -- Rank memories against a query inside the database. Like the
+        -- client-side scorer, every memory is a candidate: text matches add
+        -- to the score rather than filtering rows out, and type_weights
+        -- (memory_type -> weight, 0.1 when missing) adds the per-type weight
+        DROP FUNCTION IF EXISTS relevant_memories(UUID, TEXT, TEXT[], INTEGER);
+
+        CREATE OR REPLACE FUNCTION relevant_memories(
+            uid UUID, q TEXT, types TEXT[] DEFAULT NULL, k INTEGER DEFAULT 5,
+            type_weights JSONB DEFAULT '{}'::JSONB
+        )
+        RETURNS TABLE (
+            id UUID,
+            memory_type VARCHAR,
+            content TEXT,
+            importance INTEGER,
+            tags TEXT[],
+            created_at TIMESTAMP WITH TIME ZONE,
+            metadata JSONB,
+            calculated_relevance REAL
+        )
+        LANGUAGE sql STABLE AS $$
+            SELECT m.id, m.memory_type, m.content, m.importance, m.tags,
+                   m.created_at, m.metadata,
+                   LEAST(
+                       ts_rank_cd(m.tsv, tq)
+                       + coalesce((type_weights ->> m.memory_type)::REAL, 0.1)
+                       + m.importance * 0.2
+                       + 0.1,
+                       10.0
+                   )::REAL
+            FROM memories m, plainto_tsquery('english', coalesce(q, '')) tq
+            WHERE m.user_id = uid
+              AND (types IS NULL OR m.memory_type = ANY(types))
+            ORDER BY 8 DESC, m.created_at DESC
+            LIMIT k
+        $$;
+        """,
+
+        """
+        -- Count distinct sessions without shipping every conversation row
+        CREATE OR REPLACE FUNCTION count_active_sessions(uid UUID, since TIMESTAMP WITH TIME ZONE)
+        RETURNS INTEGER
+        LANGUAGE sql STABLE AS $$
+            SELECT COUNT(DISTINCT session_id)::INTEGER
+            FROM conversations
+            WHERE user_id = uid AND created_at >= since
+        $$;
+        """,
+
+        """
+        -- Merge a preferences patch in a single atomic statement
+        CREATE OR REPLACE FUNCTION merge_user_preferences(uid UUID, patch JSONB)
+        RETURNS JSONB
+        LANGUAGE sql AS $$
+            UPDATE users
+            SET preferences = coalesce(preferences, '{}'::jsonb) || patch,
+                updated_at = NOW()
+            WHERE id = uid
+            RETURNING preferences
+        $$;
+        """,
+
+        """
+        -- Trigram index for near-duplicate memory detection
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_memories_content_trgm ON memories USING GIN(content gin_trgm_ops);
+
+        CREATE OR REPLACE FUNCTION find_duplicate_memory_pairs(uid UUID, thresh REAL DEFAULT 0.6)
+        RETURNS TABLE (a UUID, b UUID)
+        LANGUAGE sql STABLE AS $$
+            SELECT m1.id, m2.id
+            FROM memories m1
+            JOIN memories m2
+              ON m1.user_id = m2.user_id
+             AND m1.memory_type = m2.memory_type
+             AND m1.id < m2.id
+             AND m1.content % m2.content
+            WHERE m1.user_id = uid
+              AND similarity(m1.content, m2.content) >= thresh
+        $$;
+        """,
+
         """
         -- Enable Row Level Security
         ALTER TABLE users ENABLE ROW LEVEL SECURITY;
@@ -2,12 +2,17 @@
 Enhanced context service for managing user memory and conversation history - Phase 2
 """
 
+import asyncio
+import heapq
 import logging
 import uuid
 import re
+import time
+from collections import Counter, OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 
+from app.core.config import settings
 from app.core.database import get_supabase_client
 from app.core.exceptions import DatabaseError
 from app.models.database.conversation import ConversationCreate
@@ -15,6 +20,24 @@ from app.models.database.memory import MemoryCreate
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+")
+
+# Keyword sets used by the lightweight classifiers below
+_POSITIVE_WORDS = frozenset({"good", "great", "excellent", "love", "like", "happy", "pleased"})
+_NEGATIVE_WORDS = frozenset({"bad", "terrible", "hate", "dislike", "angry", "frustrated", "disappointed"})
+_STOP_WORDS = frozenset({"the", "and", "but", "can", "you", "how", "what", "when", "where", "why"})
+_QUESTION_WORDS = frozenset({"how", "what", "why", "when", "where"})
+_REQUEST_WORDS = frozenset({"help", "assist", "do", "create", "make"})
+_OPINION_PHRASES = ("i think", "i feel", "in my opinion")
+_EXPERIENCE_PHRASES = ("i did", "i went")
+_EXPERIENCE_WORDS = frozenset({"yesterday", "today"})
+_EXPLANATORY_WORDS = frozenset({"how", "explain"})
+_ANALYTICAL_WORDS = frozenset({"why", "because", "reason"})
+_TASK_WORDS = frozenset({"help", "assist"})
+_SUMMARY_QUESTION_MARKERS = frozenset({"?", "how", "what", "why"})
+_DECISION_WORDS = frozenset({"decided", "prefer", "choose", "will"})
+_SUMMARY_MARKER_RE = re.compile(r"\?|\b(?:how|what|why|decided|prefer|choose|will)\b")
+
 
 class ContextService:
     """Enhanced context and memory management service with Phase 2 features"""
@@ -37,6 +60,9 @@ class ContextService:
             "decision": 4
         }
         
+        # Precomputed type contribution for the batch relevance scorer
+        self._type_relevance = {t: w * 0.1 for t, w in self.memory_types.items()}
+        
         # Keywords for memory extraction
         self.memory_keywords = {
             "preference": ["prefer", "like", "love", "hate", "dislike", "favorite", "enjoy", "want", "need"],
@@ -49,9 +75,39 @@ class ContextService:
             "decision": ["decided", "chose", "will do", "planning", "committed to"]
         }
         
+        # Strong references to in-flight background tasks (asyncio only keeps weak ones)
+        self._background_tasks: set = set()
+        
+        # Per-user context cache: user_id -> (expires_at, context), kept in LRU order
+        self._context_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        
         logger.info("Enhanced context service initialized")
     
     async def get_user_context(self, user_id: str) -> Dict[str, Any]:
+        """Get enhanced user context, served from the TTL cache when fresh
+        
+        Callers get their own copy, so adding keys to it never changes the
+        cached entry.
+        """
+        cached = self._context_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            self._context_cache.move_to_end(user_id)
+            return dict(cached[1])
+        
+        context = await self._build_user_context(user_id)
+        
+        self._context_cache[user_id] = (time.monotonic() + settings.USER_CONTEXT_CACHE_TTL, context)
+        self._context_cache.move_to_end(user_id)
+        while len(self._context_cache) > settings.USER_CONTEXT_CACHE_SIZE:
+            self._context_cache.popitem(last=False)
+        
+        return dict(context)
+    
+    def _invalidate_user_context(self, user_id: str) -> None:
+        """Drop cached context after a write that affects it"""
+        self._context_cache.pop(user_id, None)
+    
+    async def _build_user_context(self, user_id: str) -> Dict[str, Any]:
         """Get enhanced user context including preferences and recent activity"""
         try:
             # Get user preferences
@@ -107,8 +163,7 @@ class ContextService:
             words = re.findall(r'\b[A-Za-z]{3,}\b', user_input.lower())
             
             # Filter out common words and keep meaningful terms
-            stop_words = {"the", "and", "but", "can", "you", "how", "what", "when", "where", "why"}
-            meaningful_words = [word for word in words if word not in stop_words]
+            meaningful_words = [word for word in words if word not in _STOP_WORDS]
             
             for word in meaningful_words:
                 topic_frequency[word] = topic_frequency.get(word, 0) + 1
@@ -156,12 +211,13 @@ class ContextService:
             # Analyze question types
             for conv in conversations:
                 user_input = conv.get("user_input", "").lower()
+                words = set(_WORD_RE.findall(user_input))
                 
-                if any(word in user_input for word in ["how", "explain", "what is"]):
+                if not words.isdisjoint(_EXPLANATORY_WORDS) or "what is" in user_input:
                     patterns["question_types"]["explanatory"] = patterns["question_types"].get("explanatory", 0) + 1
-                elif any(word in user_input for word in ["why", "because", "reason"]):
+                elif not words.isdisjoint(_ANALYTICAL_WORDS):
                     patterns["question_types"]["analytical"] = patterns["question_types"].get("analytical", 0) + 1
-                elif any(word in user_input for word in ["help", "assist", "do this"]):
+                elif not words.isdisjoint(_TASK_WORDS) or "do this" in user_input:
                     patterns["question_types"]["task_oriented"] = patterns["question_types"].get("task_oriented", 0) + 1
             
             return patterns
@@ -175,11 +231,21 @@ class ContextService:
         try:
             since_date = (datetime.now() - timedelta(hours=24)).isoformat()
             
+            try:
+                # COUNT(DISTINCT session_id) in the database
+                response = self.supabase.rpc("count_active_sessions", {
+                    "uid": user_id,
+                    "since": since_date
+                }).execute()
+                return response.data or 0
+            except Exception as e:
+                logger.warning(f"count_active_sessions RPC unavailable, counting client-side: {e}")
+            
             response = self.supabase.table("conversations").select(
                 "session_id"
             ).eq("user_id", user_id).gte("created_at", since_date).execute()
             
-            sessions = set(conv.get("session_id") for conv in response.data or [] if conv.get("session_id"))
+            sessions = {sid for conv in response.data or [] if (sid := conv.get("session_id"))}
             return len(sessions)
             
         except Exception as e:
@@ -211,9 +277,14 @@ class ContextService:
             ).execute()
             
             conversation_id = response.data[0]["id"]
+            self._invalidate_user_context(user_id)
             
-            # Enhanced memory extraction from the interaction
-            await self._extract_enhanced_memories(user_id, user_input, ai_response, conversation_id)
+            # Enhanced memory extraction runs in the background, off the response path
+            task = asyncio.create_task(
+                self._extract_enhanced_memories(user_id, user_input, ai_response, conversation_id)
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._on_background_task_done)
             
             logger.info(f"Stored enhanced conversation {conversation_id}")
             return conversation_id
@@ -222,29 +293,34 @@ class ContextService:
             logger.error(f"Failed to store interaction: {e}")
             raise DatabaseError(f"Interaction storage failed: {e}")
     
+    def _on_background_task_done(self, task: asyncio.Task) -> None:
+        """Release a finished background task and log unexpected failures"""
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background memory extraction failed: {task.exception()}")
+    
     def _classify_input_type(self, user_input: str) -> str:
         """Classify the type of user input"""
         input_lower = user_input.lower()
+        words = set(_WORD_RE.findall(input_lower))
         
-        if any(word in input_lower for word in ["?", "how", "what", "why", "when", "where"]):
+        if "?" in input_lower or not words.isdisjoint(_QUESTION_WORDS):
             return "question"
-        elif any(word in input_lower for word in ["help", "assist", "do", "create", "make"]):
+        elif not words.isdisjoint(_REQUEST_WORDS):
             return "request"
-        elif any(word in input_lower for word in ["i think", "i feel", "in my opinion"]):
+        elif any(phrase in input_lower for phrase in _OPINION_PHRASES):
             return "opinion"
-        elif any(word in input_lower for word in ["i did", "i went", "yesterday", "today"]):
+        elif (any(phrase in input_lower for phrase in _EXPERIENCE_PHRASES)
+              or not words.isdisjoint(_EXPERIENCE_WORDS)):
             return "experience_sharing"
         else:
             return "general"
     
     def _analyze_sentiment(self, text: str) -> str:
         """Basic sentiment analysis of user input"""
-        positive_words = ["good", "great", "excellent", "love", "like", "happy", "pleased"]
-        negative_words = ["bad", "terrible", "hate", "dislike", "angry", "frustrated", "disappointed"]
-        
-        text_lower = text.lower()
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
+        words = _WORD_RE.findall(text.lower())
+        positive_count = sum(1 for word in words if word in _POSITIVE_WORDS)
+        negative_count = sum(1 for word in words if word in _NEGATIVE_WORDS)
         
         if positive_count > negative_count:
             return "positive"
@@ -282,31 +358,31 @@ class ContextService:
                 return "No conversations found in this session."
             
             # Create a structured summary
-            topics_discussed = set()
+            topic_counter = Counter()
             questions_asked = []
             decisions_made = []
             user_preferences_mentioned = []
             
             for conv in conversations:
                 user_input = conv.get("user_input", "")
-                ai_response = conv.get("ai_response", "")
+                input_lower = user_input.lower()
                 
                 # Extract topics (simplified)
-                input_words = user_input.lower().split()
-                topics_discussed.update([word for word in input_words if len(word) > 4])
+                topic_counter.update(word for word in input_lower.split() if len(word) > 4)
                 
-                # Identify questions
-                if "?" in user_input or any(word in user_input.lower() for word in ["how", "what", "why"]):
+                # Identify questions and decisions/preferences in one regex pass
+                markers = set(_SUMMARY_MARKER_RE.findall(input_lower))
+                if not markers.isdisjoint(_SUMMARY_QUESTION_MARKERS):
                     questions_asked.append(user_input[:100])
-                
-                # Identify decisions or preferences
-                if any(word in user_input.lower() for word in ["decided", "prefer", "choose", "will"]):
+                if not markers.isdisjoint(_DECISION_WORDS):
                     decisions_made.append(user_input[:100])
             
+            topics_discussed = [word for word, _ in topic_counter.most_common(5)]
+            
             # Build summary
             summary_parts = [
                 f"Conversation session summary for {len(conversations)} exchanges:",
-                f"Main topics: {', '.join(list(topics_discussed)[:5])}",
+                f"Main topics: {', '.join(topics_discussed)}",
             ]
             
             if questions_asked:
@@ -326,24 +402,13 @@ class ContextService:
                           source_conversation_id: Optional[str] = None) -> str:
         """Store an enhanced memory for the user"""
         try:
-            memory_data = {
-                "user_id": user_id,
-                "memory_type": memory_type,
-                "content": content,
-                "importance": importance,
-                "tags": tags or [],
-                "metadata": {
-                    "created_timestamp": datetime.now().isoformat(),
-                    "auto_generated": source_conversation_id is not None,
-                    "source_conversation_id": source_conversation_id,
-                    "last_accessed": datetime.now().isoformat(),
-                    "access_count": 0,
-                    "relevance_score": self._calculate_relevance_score(memory_type, importance, tags or [])
-                }
-            }
+            memory_data = self._build_memory_row(
+                user_id, memory_type, content, importance, tags, source_conversation_id
+            )
             
             response = self.supabase.table("memories").insert(memory_data).execute()
             memory_id = response.data[0]["id"]
+            self._invalidate_user_context(user_id)
             
             logger.info(f"Stored enhanced memory {memory_id} of type {memory_type}")
             return memory_id
@@ -352,6 +417,26 @@ class ContextService:
             logger.error(f"Failed to store memory: {e}")
             raise DatabaseError(f"Memory storage failed: {e}")
     
+    def _build_memory_row(self, user_id: str, memory_type: str, content: str,
+                          importance: int = 1, tags: Optional[List[str]] = None,
+                          source_conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build a memories table row with tracking metadata"""
+        return {
+            "user_id": user_id,
+            "memory_type": memory_type,
+            "content": content,
+            "importance": importance,
+            "tags": tags or [],
+            "metadata": {
+                "created_timestamp": datetime.now().isoformat(),
+                "auto_generated": source_conversation_id is not None,
+                "source_conversation_id": source_conversation_id,
+                "last_accessed": datetime.now().isoformat(),
+                "access_count": 0,
+                "relevance_score": self._calculate_relevance_score(memory_type, importance, tags or [])
+            }
+        }
+    
     def _calculate_relevance_score(self, memory_type: str, importance: int, tags: List[str]) -> float:
         """Calculate relevance score for memory ranking"""
         base_score = importance * self.memory_types.get(memory_type, 1)
@@ -362,70 +447,94 @@ class ContextService:
                                   limit: int = 5, memory_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get memories relevant to the current query with enhanced ranking"""
         try:
-            # Build query
-            query_builder = self.supabase.table("memories").select(
-                "id, memory_type, content, importance, tags, created_at, metadata"
-            ).eq("user_id", user_id)
-            
-            # Filter by memory types if specified
-            if memory_types:
-                query_builder = query_builder.in_("memory_type", memory_types)
-            
-            response = query_builder.order("importance", desc=True).order(
-                "created_at", desc=True
-            ).limit(limit * 3).execute()  # Get more to filter from
+            try:
+                # Full-text ranking runs in Postgres (tsvector GIN index + ts_rank_cd)
+                response = self.supabase.rpc("relevant_memories", {
+                    "uid": user_id,
+                    "q": query,
+                    "types": memory_types or None,
+                    "k": limit,
+                    "type_weights": self._type_relevance
+                }).execute()
+                relevant_memories = response.data or []
+            except Exception as e:
+                logger.warning(f"relevant_memories RPC unavailable, ranking client-side: {e}")
+                relevant_memories = await self._rank_memories_locally(
+                    user_id, query, limit, memory_types
+                )
+
+            # Update access tracking
+            for memory in relevant_memories:
+                await self._update_memory_access(memory["id"])
+
+            return relevant_memories
+
+        except Exception as e:
+            logger.error(f"Failed to get relevant memories: {e}")
+            return []
+
+    async def _rank_memories_locally(self, user_id: str, query: str, limit: int,
+                                     memory_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Fallback ranking used when the relevant_memories RPC is not deployed"""
+        query_builder = self.supabase.table("memories").select(
+            "id, memory_type, content, importance, tags, created_at, metadata"
+        ).eq("user_id", user_id)
+
+        if memory_types:
+            query_builder = query_builder.in_("memory_type", memory_types)
+
+        response = query_builder.order("importance", desc=True).order(
+            "created_at", desc=True
+        ).limit(limit * 3).execute()  # Get more to filter from
+
+        memories = response.data or []
+        scores = self._score_memories(memories, set(query.lower().split()))
+
+        # Partial top-k selection instead of sorting the whole candidate pool
+        top = heapq.nlargest(
+            limit,
+            (i for i, score in enumerate(scores) if score > 0),
+            key=scores.__getitem__
+        )
+
+        relevant_memories = []
+        for i in top:
+            memories[i]["calculated_relevance"] = scores[i]
+            relevant_memories.append(memories[i])
+        return relevant_memories
+
+    def _score_memories(self, memories: List[Dict[str, Any]], query_words: set) -> List[float]:
+        """Score a batch of memories against the query in a single pass"""
+        type_relevance = self._type_relevance
+        query_len = max(len(query_words), 1)
+        scores = []
+        
+        for memory in memories:
+            # Word overlap score
+            word_overlap = len(query_words.intersection(memory.get("content", "").lower().split()))
+            word_score = word_overlap / query_len
             
-            memories = response.data or []
+            # Tag overlap score
+            tag_words = " ".join(memory.get("tags", [])).lower().split()
+            tag_score = len(query_words.intersection(tag_words)) * 0.5
             
-            # Enhanced relevance filtering
-            relevant_memories = []
-            query_words = set(query.lower().split())
+            # Memory type relevance
+            type_score = type_relevance.get(memory.get("memory_type", ""), 0.1)
             
-            for memory in memories:
-                relevance_score = self._calculate_memory_relevance(memory, query_words)
-                if relevance_score > 0:
-                    memory["calculated_relevance"] = relevance_score
-                    relevant_memories.append(memory)
-                    
-                    # Update access tracking
-                    await self._update_memory_access(memory["id"])
+            # Importance weighting
+            importance_score = memory.get("importance", 1) * 0.2
             
-            # Sort by relevance and return top results
-            relevant_memories.sort(key=lambda x: x["calculated_relevance"], reverse=True)
-            return relevant_memories[:limit]
+            # Time decay (recent memories get slight boost)
+            time_score = 0.1  # Simplified for now
             
-        except Exception as e:
-            logger.error(f"Failed to get relevant memories: {e}")
-            return []
+            total_score = word_score + tag_score + type_score + importance_score + time_score
+            scores.append(min(total_score, 10.0))
+        
+        return scores
     
     def _calculate_memory_relevance(self, memory: Dict[str, Any], query_words: set) -> float:
         """Calculate how relevant a memory is to the current query"""
-        content = memory.get("content", "").lower()
-        tags = memory.get("tags", [])
-        memory_type = memory.get("memory_type", "")
-        importance = memory.get("importance", 1)
-        
-        # Word overlap score
-        memory_words = set(content.split())
-        word_overlap = len(query_words & memory_words)
-        word_score = word_overlap / max(len(query_words), 1)
-        
-        # Tag overlap score
-        tag_words = set(" ".join(tags).lower().split())
-        tag_overlap = len(query_words & tag_words)
-        tag_score = tag_overlap * 0.5
-        
-        # Memory type relevance
-        type_score = self.memory_types.get(memory_type, 1) * 0.1
-        
-        # Importance weighting
-        importance_score = importance * 0.2
-        
-        # Time decay (recent memories get slight boost)
-        time_score = 0.1  # Simplified for now
-        
-        total_score = word_score + tag_score + type_score + importance_score + time_score
-        return min(total_score, 10.0)
+        return self._score_memories([memory], query_words)[0]
     
     async def _update_memory_access(self, memory_id: str) -> None:
         """Update memory access tracking"""
@@ -447,29 +556,36 @@ class ContextService:
                                     preferences: Dict[str, Any]) -> bool:
         """Update user preferences with learning integration"""
         try:
-            # Get current preferences
-            current_response = self.supabase.table("users").select("preferences").eq("id", user_id).execute()
-            current_prefs = current_response.data[0].get("preferences", {}) if current_response.data else {}
-            
-            # Merge with new preferences
-            updated_prefs = {**current_prefs, **preferences}
-            
-            # Update database
-            response = self.supabase.table("users").update(
-                {"preferences": updated_prefs}
-            ).eq("id", user_id).execute()
-            
-            # Store preference changes as memories
-            for key, value in preferences.items():
-                await self.store_memory(
-                    user_id=user_id,
-                    memory_type="preference",
-                    content=f"User preference: {key} = {value}",
-                    importance=3,
-                    tags=["preference", "auto_generated", key]
+            try:
+                # Atomic server-side jsonb merge (preferences || patch)
+                response = self.supabase.rpc("merge_user_preferences", {
+                    "uid": user_id,
+                    "patch": preferences
+                }).execute()
+                updated = response.data is not None
+            except Exception as e:
+                logger.warning(f"merge_user_preferences RPC unavailable, merging client-side: {e}")
+                current_response = self.supabase.table("users").select("preferences").eq("id", user_id).execute()
+                current_prefs = current_response.data[0].get("preferences", {}) if current_response.data else {}
+                
+                response = self.supabase.table("users").update(
+                    {"preferences": {**current_prefs, **preferences}}
+                ).eq("id", user_id).execute()
+                updated = len(response.data) > 0
+            
+            # Store preference changes as memories in a single insert
+            rows = [
+                self._build_memory_row(
+                    user_id, "preference", f"User preference: {key} = {value}",
+                    3, ["preference", "auto_generated", key]
                 )
+                for key, value in preferences.items()
+            ]
+            if rows:
+                self.supabase.table("memories").insert(rows).execute()
             
-            return len(response.data) > 0
+            self._invalidate_user_context(user_id)
+            return updated
             
         except Exception as e:
             logger.error(f"Failed to update preferences: {e}")
@@ -585,19 +701,27 @@ class ContextService:
     async def optimize_memories(self, user_id: str) -> Dict[str, Any]:
         """Optimize user memories by removing duplicates and low-value entries"""
         try:
-            # Get all user memories
-            response = self.supabase.table("memories").select("*").eq("user_id", user_id).execute()
-            memories = response.data or []
-            
-            if not memories:
-                return {"optimized": 0, "removed": 0, "total": 0}
-            
-            # Group similar memories
-            memory_groups = self._group_similar_memories(memories)
+            try:
+                # Near-duplicate detection runs in Postgres (pg_trgm GIN index)
+                memory_groups, total = await self._find_duplicate_groups(user_id)
+            except Exception as e:
+                logger.warning(f"find_duplicate_memory_pairs RPC unavailable, grouping client-side: {e}")
+                
+                # Get all user memories
+                response = self.supabase.table("memories").select("*").eq("user_id", user_id).execute()
+                memories = response.data or []
+                
+                if not memories:
+                    return {"optimized": 0, "removed": 0, "total": 0}
+                
+                # Group similar memories (CPU-bound, keep it off the event loop)
+                memory_groups = await asyncio.to_thread(self._group_similar_memories, memories)
+                total = len(memories)
             
             # Remove duplicates and merge similar memories
             optimized_count = 0
-            removed_count = 0
+            rows_to_update = []
+            ids_to_delete = []
             
             for group in memory_groups:
                 if len(group) > 1:
@@ -611,39 +735,93 @@ class ContextService:
                     for dup in duplicates:
                         all_tags.update(dup.get("tags", []))
                     
-                    # Update best memory
-                    self.supabase.table("memories").update({
-                        "tags": list(all_tags),
-                        "metadata": {
-                            **best_memory.get("metadata", {}),
-                            "optimized": True,
-                            "combined_memories": len(group)
-                        }
-                    }).eq("id", best_memory["id"]).execute()
-                    
-                    # Remove duplicates
-                    for dup in duplicates:
-                        self.supabase.table("memories").delete().eq("id", dup["id"]).execute()
-                        removed_count += 1
+                    # Generated columns cannot be written back
+                    row = {k: v for k, v in best_memory.items() if k != "tsv"}
+                    row["tags"] = list(all_tags)
+                    row["metadata"] = {
+                        **best_memory.get("metadata", {}),
+                        "optimized": True,
+                        "combined_memories": len(group)
+                    }
+                    rows_to_update.append(row)
+                    ids_to_delete.extend(dup["id"] for dup in duplicates)
                     
                     optimized_count += 1
             
+            # One round-trip for all merged rows and one for all removals
+            if rows_to_update:
+                self.supabase.table("memories").upsert(rows_to_update).execute()
+            if ids_to_delete:
+                self.supabase.table("memories").delete().in_("id", ids_to_delete).execute()
+            removed_count = len(ids_to_delete)
+            self._invalidate_user_context(user_id)
+            
             logger.info(f"Memory optimization complete: {optimized_count} optimized, {removed_count} removed")
             return {
                 "optimized": optimized_count,
                 "removed": removed_count,
-                "total": len(memories)
+                "total": total
             }
             
         except Exception as e:
             logger.error(f"Memory optimization failed: {e}")
             return {"error": str(e)}
     
+    async def _find_duplicate_groups(self, user_id: str) -> Tuple[List[List[Dict[str, Any]]], int]:
+        """Cluster near-duplicate memories from database similarity pairs"""
+        pairs_response = self.supabase.rpc("find_duplicate_memory_pairs", {
+            "uid": user_id,
+            "thresh": 0.6
+        }).execute()
+        pairs = pairs_response.data or []
+        
+        count_response = self.supabase.table("memories").select(
+            "id", count="exact"
+        ).eq("user_id", user_id).limit(1).execute()
+        total = count_response.count or 0
+        
+        if not pairs:
+            return [], total
+        
+        # Union-find over the similar pairs
+        parent: Dict[str, str] = {}
+        
+        def find(memory_id: str) -> str:
+            parent.setdefault(memory_id, memory_id)
+            while parent[memory_id] != memory_id:
+                parent[memory_id] = parent[parent[memory_id]]
+                memory_id = parent[memory_id]
+            return memory_id
+        
+        for pair in pairs:
+            root_a, root_b = find(pair["a"]), find(pair["b"])
+            if root_a != root_b:
+                parent[root_b] = root_a
+        
+        clusters: Dict[str, List[str]] = {}
+        for memory_id in parent:
+            clusters.setdefault(find(memory_id), []).append(memory_id)
+        
+        # Only the rows that take part in a merge are fetched
+        rows_response = self.supabase.table("memories").select("*").in_(
+            "id", list(parent)
+        ).execute()
+        rows_by_id = {row["id"]: row for row in rows_response.data or []}
+        
+        groups = [
+            [rows_by_id[memory_id] for memory_id in cluster if memory_id in rows_by_id]
+            for cluster in clusters.values()
+        ]
+        return groups, total
+    
     def _group_similar_memories(self, memories: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
         """Group similar memories for optimization"""
         groups = []
         used_memories = set()
         
+        # Tokenize each memory once instead of once per comparison
+        keys = [self._similarity_key(memory) for memory in memories]
+        
         for i, memory in enumerate(memories):
             if i in used_memories:
                 continue
@@ -651,13 +829,13 @@ class ContextService:
             similar_group = [memory]
             used_memories.add(i)
             
-            for j, other_memory in enumerate(memories[i+1:], i+1):
+            for j in range(i + 1, len(memories)):
                 if j in used_memories:
                     continue
                     
                 # Check similarity
-                if self._are_memories_similar(memory, other_memory):
-                    similar_group.append(other_memory)
+                if self._are_keys_similar(keys[i], keys[j]):
+                    similar_group.append(memories[j])
                     used_memories.add(j)
             
             groups.append(similar_group)
@@ -666,22 +844,41 @@ class ContextService:
     
     def _are_memories_similar(self, memory1: Dict[str, Any], memory2: Dict[str, Any]) -> bool:
         """Check if two memories are similar enough to be merged"""
+        return self._are_keys_similar(self._similarity_key(memory1), self._similarity_key(memory2))
+    
+    @staticmethod
+    def _similarity_key(memory: Dict[str, Any]) -> Tuple[Any, frozenset, int]:
+        """Memory type, content word set and a 256-bit word signature"""
+        words = frozenset(memory.get("content", "").lower().split())
+        signature = 0
+        for word in words:
+            signature |= 1 << (hash(word) & 255)
+        return memory.get("memory_type"), words, signature
+    
+    @staticmethod
+    def _are_keys_similar(key1: Tuple[Any, frozenset, int], key2: Tuple[Any, frozenset, int]) -> bool:
+        """Jaccard word similarity above 0.6 for two precomputed similarity keys"""
+        type1, words1, signature1 = key1
+        type2, words2, signature2 = key2
+        
         # Same type and similar content
-        if memory1.get("memory_type") != memory2.get("memory_type"):
+        if type1 != type2:
             return False
         
-        content1 = memory1.get("content", "").lower()
-        content2 = memory2.get("content", "").lower()
+        n1, n2 = len(words1), len(words2)
+        if not n1 or not n2:
+            return False
         
-        # Simple similarity check - more than 60% word overlap
-        words1 = set(content1.split())
-        words2 = set(content2.split())
+        # Jaccard similarity can never exceed min/max of the set sizes
+        if min(n1, n2) / max(n1, n2) <= 0.6:
+            return False
         
-        if not words1 or not words2:
+        # Bloom-style prefilter: a shared word always sets a shared bit
+        if not signature1 & signature2:
             return False
         
+        # Simple similarity check - more than 60% word overlap
         overlap = len(words1 & words2)
-        union = len(words1 | words2)
-        similarity = overlap / union
+        similarity = overlap / (n1 + n2 - overlap)
         
         return similarity > 0.6 
\ No newline at end of file
@@ -4,13 +4,17 @@ Handles launching, controlling, and monitoring Windows applications
 """
 
 import os
+import functools
+import heapq
+import shutil
 import subprocess
+import tempfile
 import psutil
 import logging
 import time
 import platform
-from typing import Dict, Any, List, Optional
-from pathlib import Path
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
 # Windows-specific imports with fallback
 try:
@@ -29,11 +33,65 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+_INV_MB = 1.0 / (1024 * 1024)
+_INV_GB = 1.0 / (1024 ** 3)
+
+# Candidate locations for common applications
+_APP_PATH_CANDIDATES = {
+    'notepad': 'notepad.exe',
+    'calculator': 'calc.exe',
+    'cmd': 'cmd.exe',
+    'powershell': 'powershell.exe',
+    'explorer': 'explorer.exe',
+    'chrome': [
+        r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+        r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe'
+    ],
+    'firefox': [
+        r'C:\Program Files\Mozilla Firefox\firefox.exe',
+        r'C:\Program Files (x86)\Mozilla Firefox\firefox.exe'
+    ],
+    'edge': r'C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe',
+    'vscode': [
+        r'C:\Program Files\Microsoft VS Code\Code.exe',
+        r'C:\Users\{}\AppData\Local\Programs\Microsoft VS Code\Code.exe'.format(os.getenv('USERNAME'))
+    ]
+}
+
+# System commands that resolve through PATH even if not found as a file
+_BUILTIN_EXES = frozenset({'notepad.exe', 'calc.exe', 'cmd.exe', 'powershell.exe', 'explorer.exe'})
+
+
+def _probe_app_candidates(candidates) -> Optional[str]:
+    """Return the first candidate path that exists (or is a builtin exe)"""
+    if isinstance(candidates, str):
+        candidates = [candidates]
+    return next(
+        (path for path in candidates if path in _BUILTIN_EXES or os.path.exists(path)),
+        None
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _installed_app_paths() -> Dict[str, Optional[str]]:
+    """Probe every candidate path once and keep the first one that exists"""
+    return {
+        app_name: _probe_app_candidates(candidates)
+        for app_name, candidates in _APP_PATH_CANDIDATES.items()
+    }
+
 
 class AppControl:
     """Windows application control service"""
     
-    def __init__(self):
+    def __init__(self, launch_check_timeout: float = 0.05):
+        # How long launch_application waits to detect an immediate exit
+        self.launch_check_timeout = launch_check_timeout
+        
+        # Prime psutil's system-wide CPU counter so get_system_info can sample
+        # without blocking
+        psutil.cpu_percent(interval=None)
+        
         # Check if we're running on Windows
         self.is_windows = platform.system() == "Windows"
         self.windows_api_available = WINDOWS_API_AVAILABLE and self.is_windows
@@ -43,70 +101,60 @@ class AppControl:
         elif not WINDOWS_API_AVAILABLE:
             logger.warning("pywin32 not available. Window management features will be disabled.")
         
-        # Define common application paths
-        self.app_paths = {
-            'notepad': 'notepad.exe',
-            'calculator': 'calc.exe',
-            'cmd': 'cmd.exe',
-            'powershell': 'powershell.exe',
-            'explorer': 'explorer.exe',
-            'chrome': [
-                r'C:\Program Files\Google\Chrome\Application\chrome.exe',
-                r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe'
-            ],
-            'firefox': [
-                r'C:\Program Files\Mozilla Firefox\firefox.exe',
-                r'C:\Program Files (x86)\Mozilla Firefox\firefox.exe'
-            ],
-            'edge': r'C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe',
-            'vscode': [
-                r'C:\Program Files\Microsoft VS Code\Code.exe',
-                r'C:\Users\{}\AppData\Local\Programs\Microsoft VS Code\Code.exe'.format(os.getenv('USERNAME'))
-            ]
-        }
+        # Common applications, resolved once per process to a path (or None)
+        self.app_paths = _installed_app_paths()
+        
+        # Resolved application paths, keyed by lowercase app name
+        self._path_cache: Dict[str, str] = {}
+        
+        # Last EnumWindows snapshot: (monotonic timestamp, [(hwnd, title)])
+        self._windows_cache: Tuple[float, List[Tuple[int, str]]] = (0.0, [])
         
         # Define restricted applications for security
-        self.restricted_apps = {
+        self.restricted_apps = frozenset({
             'regedit.exe', 'msconfig.exe', 'gpedit.msc', 'services.msc',
             'taskmgr.exe', 'control.exe', 'mmc.exe'
-        }
+        })
     
     def _find_app_path(self, app_name: str) -> Optional[str]:
-        """Find the full path to an application"""
+        """Find the full path to an application (memoized per app name)
+        
+        Only hits are memoized, so an app installed after a failed lookup is
+        found on the next attempt.
+        """
         app_name_lower = app_name.lower()
         
-        # Check if it's in our predefined paths
-        if app_name_lower in self.app_paths:
-            app_path = self.app_paths[app_name_lower]
-            
-            if isinstance(app_path, list):
-                # Multiple possible paths
-                for path in app_path:
-                    if os.path.exists(path):
-                        return path
-            elif isinstance(app_path, str):
-                # Single path or system command
-                if os.path.exists(app_path) or app_path in ['notepad.exe', 'calc.exe', 'cmd.exe', 'powershell.exe']:
-                    return app_path
+        app_path = self._path_cache.get(app_name_lower)
+        if app_path is None:
+            app_path = self._resolve_app_path(app_name, app_name_lower)
+            if app_path is not None:
+                self._path_cache[app_name_lower] = app_path
+        return app_path
+    
+    def _resolve_app_path(self, app_name: str, app_name_lower: str) -> Optional[str]:
+        """Resolve an application name to a path without caching"""
+        # Check if it's in our predefined (pre-resolved) paths
+        app_path = self.app_paths.get(app_name_lower)
+        if app_path:
+            return app_path
+        
+        # A known app missing at startup may have been installed since
+        if app_name_lower in _APP_PATH_CANDIDATES:
+            app_path = _probe_app_candidates(_APP_PATH_CANDIDATES[app_name_lower])
+            if app_path:
+                self.app_paths[app_name_lower] = app_path
+                return app_path
         
         # Check if it's a direct path
         if os.path.exists(app_name):
             return app_name
         
-        # Try to find in PATH
-        try:
-            result = subprocess.run(['where', app_name], capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout.strip().split('\n')[0]
-        except:
-            pass
-        
-        return None
+        # Try to find in PATH (honours PATHEXT on Windows)
+        return shutil.which(app_name)
     
     def _is_app_allowed(self, app_path: str) -> bool:
         """Check if application is allowed to be launched"""
-        app_name = Path(app_path).name.lower()
-        return app_name not in self.restricted_apps
+        return os.path.basename(app_path).lower() not in self.restricted_apps
     
     def launch_application(self, app_name: str, args: Optional[List[str]] = None) -> Dict[str, Any]:
         """Launch a Windows application"""
@@ -130,31 +178,38 @@ class AppControl:
             if args:
                 command.extend(args)
             
-            # Launch application
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
-            )
-            
-            # Wait a moment to check if it started successfully
-            time.sleep(1)
-            
-            if process.poll() is None:  # Process is still running
-                return {
-                    'success': True,
-                    'message': f'Application launched: {app_name}',
-                    'pid': process.pid,
-                    'app_path': app_path,
-                    'command': ' '.join(command)
-                }
-            else:
+            # Launch application. Long-running apps must not hold pipes to us:
+            # stdout is discarded and stderr goes to an unlinked temp file that
+            # is only read if the process exits during the launch check.
+            with tempfile.TemporaryFile() as stderr_file:
+                process = subprocess.Popen(
+                    command,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr_file,
+                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                )
+                
+                # Briefly check whether it exited immediately
+                try:
+                    process.wait(timeout=self.launch_check_timeout)
+                except subprocess.TimeoutExpired:
+                    pass
+                
+                if process.returncode is None:  # Process is still running
+                    return {
+                        'success': True,
+                        'message': f'Application launched: {app_name}',
+                        'pid': process.pid,
+                        'app_path': app_path,
+                        'command': ' '.join(command)
+                    }
+                
                 # Process terminated immediately
-                stdout, stderr = process.communicate()
+                stderr_file.seek(0)
+                stderr = stderr_file.read()
                 return {
                     'success': False,
-                    'error': f'Application failed to start: {stderr.decode()}',
+                    'error': f'Application failed to start: {stderr.decode(errors="replace")}',
                     'return_code': process.returncode
                 }
             
@@ -165,23 +220,29 @@ class AppControl:
                 'error': str(e)
             }
     
-    def kill_process(self, process_name: str) -> Dict[str, Any]:
-        """Kill a process by name"""
+    def kill_process(self, process_name: Union[str, Iterable[str]]) -> Dict[str, Any]:
+        """Kill processes by name (one name or several in a single pass)"""
         try:
+            names = [process_name] if isinstance(process_name, str) else list(process_name)
+            targets = frozenset(name.lower() for name in names)
             killed_processes = []
             
             for process in psutil.process_iter(['pid', 'name']):
+                info = process.info
+                name = info['name']
+                if not name or name.lower() not in targets:
+                    continue
                 try:
-                    if process.name().lower() == process_name.lower():
-                        process.kill()
-                        killed_processes.append({
-                            'pid': process.pid,
-                            'name': process.name()
-                        })
+                    process.kill()
+                    killed_processes.append({
+                        'pid': info['pid'],
+                        'name': name
+                    })
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
             
             if killed_processes:
+                self.clear_process_cache()
                 return {
                     'success': True,
                     'message': f'Killed {len(killed_processes)} process(es)',
@@ -190,7 +251,7 @@ class AppControl:
             else:
                 return {
                     'success': False,
-                    'error': f'No processes found with name: {process_name}'
+                    'error': f'No processes found with name: {", ".join(names)}'
                 }
                 
         except Exception as e:
@@ -200,29 +261,61 @@ class AppControl:
                 'error': str(e)
             }
     
-    def list_processes(self) -> Dict[str, Any]:
-        """List running processes"""
+    def clear_process_cache(self) -> None:
+        """Drop psutil's cached Process objects so the next scan starts fresh.
+
+        process_iter() reuses Process instances between calls; psutil >= 6.0
+        exposes cache_clear() to reset that cache explicitly.
+        """
+        cache_clear = getattr(psutil.process_iter, 'cache_clear', None)
+        if cache_clear is not None:
+            cache_clear()
+    
+    def _iter_processes(self) -> Iterator[Tuple[float, int, str, psutil.Process]]:
+        """Yield (memory_mb, pid, name, process) for each accessible process"""
+        # process_iter prefetches attrs under oneshot(); read them from .info only
+        for process in psutil.process_iter(['pid', 'name', 'memory_info']):
+            info = process.info
+            if info['memory_info'] is None:  # Access denied
+                continue
+            yield round(info['memory_info'].rss * _INV_MB, 2), info['pid'], info['name'], process
+    
+    def list_processes(self, limit: int = 50) -> Dict[str, Any]:
+        """List running processes, the top `limit` by memory usage"""
         try:
-            processes = []
+            top = []  # Bounded min-heap of (memory_mb, pid, name, process)
+            total_processes = 0
+            
+            for item in self._iter_processes():
+                total_processes += 1
+                
+                # Keep only the top entries by memory usage
+                if len(top) < limit:
+                    heapq.heappush(top, item)
+                elif top and item[:2] > top[0][:2]:
+                    heapq.heapreplace(top, item)
+            
+            top.sort(key=lambda item: item[:2], reverse=True)
             
-            for process in psutil.process_iter(['pid', 'name', 'memory_info', 'cpu_percent']):
+            # CPU is sampled only for the winners. The sample is non-blocking and
+            # relative to the previous one, so a process's first reading is 0.0.
+            processes = []
+            for memory_mb, pid, name, process in top:
                 try:
-                    processes.append({
-                        'pid': process.pid,
-                        'name': process.name(),
-                        'memory_mb': round(process.memory_info().rss / 1024 / 1024, 2),
-                        'cpu_percent': process.cpu_percent()
-                    })
+                    cpu_percent = process.cpu_percent(interval=None)
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            
-            # Sort by memory usage
-            processes.sort(key=lambda x: x['memory_mb'], reverse=True)
+                    cpu_percent = None
+                processes.append({
+                    'pid': pid,
+                    'name': name,
+                    'memory_mb': memory_mb,
+                    'cpu_percent': cpu_percent
+                })
             
             return {
                 'success': True,
-                'processes': processes[:50],  # Limit to top 50 processes
-                'total_processes': len(processes)
+                'processes': processes,
+                'total_processes': total_processes
             }
             
         except Exception as e:
@@ -232,6 +325,54 @@ class AppControl:
                 'error': str(e)
             }
     
+    def _enumerate_windows(self, ttl: float = 0.1) -> List[Tuple[int, str]]:
+        """Snapshot visible, titled top-level windows, reusing a recent snapshot"""
+        timestamp, windows = self._windows_cache
+        now = time.monotonic()
+        if now - timestamp < ttl:
+            return windows
+        
+        def enum_windows_callback(hwnd, windows):
+            if win32gui.IsWindowVisible(hwnd):  # type: ignore
+                window_text = win32gui.GetWindowText(hwnd)  # type: ignore
+                if window_text:  # Only include windows with titles
+                    windows.append((hwnd, window_text))
+            return True
+        
+        windows = []
+        win32gui.EnumWindows(enum_windows_callback, windows)  # type: ignore
+        self._windows_cache = (now, windows)
+        return windows
+    
+    def _find_window_by_substring(self, window_title: str) -> Optional[Tuple[int, str]]:
+        """Find the first visible window whose title contains window_title.
+
+        Tries an exact FindWindow first, then walks top-level windows with
+        FindWindowEx so the scan stops at the first match.
+        """
+        def find_window_ex(after: int) -> int:
+            try:
+                return win32gui.FindWindowEx(0, after, None, None)  # type: ignore
+            except win32gui.error:  # type: ignore  # Newer pywin32 raises at the end
+                return 0
+        
+        try:
+            hwnd = win32gui.FindWindow(None, window_title)  # type: ignore
+        except win32gui.error:  # type: ignore
+            hwnd = 0
+        if hwnd and win32gui.IsWindowVisible(hwnd):  # type: ignore
+            return hwnd, win32gui.GetWindowText(hwnd)  # type: ignore
+        
+        target = window_title.lower()
+        hwnd = find_window_ex(0)
+        while hwnd:
+            if win32gui.IsWindowVisible(hwnd):  # type: ignore
+                window_text = win32gui.GetWindowText(hwnd)  # type: ignore
+                if target in window_text.lower():
+                    return hwnd, window_text
+            hwnd = find_window_ex(hwnd)
+        return None
+    
     def focus_window(self, window_title: str) -> Dict[str, Any]:
         """Focus a window by title"""
         if not self.windows_api_available:
@@ -241,24 +382,16 @@ class AppControl:
             }
             
         try:
-            def enum_windows_callback(hwnd, windows):
-                if win32gui.IsWindowVisible(hwnd):  # type: ignore
-                    window_text = win32gui.GetWindowText(hwnd)  # type: ignore
-                    if window_title.lower() in window_text.lower():
-                        windows.append((hwnd, window_text))
-                return True
+            match = self._find_window_by_substring(window_title)
             
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)  # type: ignore
-            
-            if not windows:
+            if match is None:
                 return {
                     'success': False,
                     'error': f'No window found with title containing: {window_title}'
                 }
             
             # Focus the first matching window
-            hwnd, title = windows[0]
+            hwnd, title = match
             
             # Restore window if minimized
             if win32gui.IsIconic(hwnd):  # type: ignore
@@ -281,8 +414,8 @@ class AppControl:
                 'error': str(e)
             }
     
-    def list_windows(self) -> Dict[str, Any]:
-        """List all visible windows"""
+    def list_windows(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """List visible windows, at most `limit` if given"""
         if not self.windows_api_available:
             return {
                 'success': False,
@@ -290,30 +423,26 @@ class AppControl:
             }
             
         try:
-            def enum_windows_callback(hwnd, windows):
-                if win32gui.IsWindowVisible(hwnd):  # type: ignore
-                    window_text = win32gui.GetWindowText(hwnd)  # type: ignore
-                    if window_text:  # Only include windows with titles
-                        try:
-                            _, pid = win32process.GetWindowThreadProcessId(hwnd)  # type: ignore
-                            process_name = psutil.Process(pid).name()
-                            windows.append({
-                                'handle': hwnd,
-                                'title': window_text,
-                                'pid': pid,
-                                'process_name': process_name
-                            })
-                        except:
-                            windows.append({
-                                'handle': hwnd,
-                                'title': window_text,
-                                'pid': None,
-                                'process_name': 'Unknown'
-                            })
-                return True
+            # One process scan instead of a psutil.Process per window
+            pid_to_name = {
+                process.info['pid']: process.info['name']
+                for process in psutil.process_iter(['pid', 'name'])
+            }
             
             windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)  # type: ignore
+            for hwnd, window_text in islice(self._enumerate_windows(), limit):
+                try:
+                    _, pid = win32process.GetWindowThreadProcessId(hwnd)  # type: ignore
+                except Exception:
+                    # The window closed mid-listing or its handle is invalid
+                    pid = None
+                process_name = pid_to_name.get(pid)
+                windows.append({
+                    'handle': hwnd,
+                    'title': window_text,
+                    'pid': pid if process_name else None,
+                    'process_name': process_name or 'Unknown'
+                })
             
             return {
                 'success': True,
@@ -337,24 +466,16 @@ class AppControl:
             }
             
         try:
-            def enum_windows_callback(hwnd, windows):
-                if win32gui.IsWindowVisible(hwnd):  # type: ignore
-                    window_text = win32gui.GetWindowText(hwnd)  # type: ignore
-                    if window_title.lower() in window_text.lower():
-                        windows.append((hwnd, window_text))
-                return True
+            match = self._find_window_by_substring(window_title)
             
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)  # type: ignore
-            
-            if not windows:
+            if match is None:
                 return {
                     'success': False,
                     'error': f'No window found with title containing: {window_title}'
                 }
             
             # Minimize the first matching window
-            hwnd, title = windows[0]
+            hwnd, title = match
             win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)  # type: ignore
             
             return {
@@ -371,7 +492,11 @@ class AppControl:
             }
     
     def get_system_info(self) -> Dict[str, Any]:
-        """Get system information"""
+        """Get system information.
+
+        CPU percent is measured since the previous sample (or since this
+        service was created), so two calls within ~100 ms may report 0.0.
+        """
         try:
             # Get CPU information
             cpu_freq_info = psutil.cpu_freq()
@@ -390,25 +515,25 @@ class AppControl:
             
             cpu_info = {
                 'count': psutil.cpu_count(),
-                'percent': psutil.cpu_percent(interval=1),
+                'percent': psutil.cpu_percent(interval=None),
                 'freq': freq_dict
             }
             
             # Get memory information
             memory = psutil.virtual_memory()
             memory_info = {
-                'total_gb': round(memory.total / 1024**3, 2),
-                'available_gb': round(memory.available / 1024**3, 2),
-                'used_gb': round(memory.used / 1024**3, 2),
+                'total_gb': round(memory.total * _INV_GB, 2),
+                'available_gb': round(memory.available * _INV_GB, 2),
+                'used_gb': round(memory.used * _INV_GB, 2),
                 'percent': memory.percent
             }
             
             # Get disk information
             disk = psutil.disk_usage('C:')
             disk_info = {
-                'total_gb': round(disk.total / 1024**3, 2),
-                'free_gb': round(disk.free / 1024**3, 2),
-                'used_gb': round(disk.used / 1024**3, 2),
+                'total_gb': round(disk.total * _INV_GB, 2),
+                'free_gb': round(disk.free * _INV_GB, 2),
+                'used_gb': round(disk.used * _INV_GB, 2),
                 'percent': round((disk.used / disk.total) * 100, 2)
             }
             
@@ -4,6 +4,8 @@ Handles calendar event management (mock implementation)
 """
 
 import logging
+import uuid
+from itertools import islice
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
@@ -11,12 +13,34 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Demo events returned while no events have been created
+_DEFAULT_MOCK_EVENTS = (
+    {
+        'id': 'event_1',
+        'title': 'Team Meeting',
+        'description': 'Weekly team sync',
+        'start_time': '2024-01-15T10:00:00Z',
+        'end_time': '2024-01-15T11:00:00Z',
+        'attendees': ['user@example.com'],
+        'location': 'Conference Room A'
+    },
+    {
+        'id': 'event_2',
+        'title': 'Project Review',
+        'description': 'Quarterly project review',
+        'start_time': '2024-01-16T14:00:00Z',
+        'end_time': '2024-01-16T15:30:00Z',
+        'attendees': ['manager@example.com'],
+        'location': 'Meeting Room B'
+    }
+)
+
 
 class CalendarAutomation:
     """Calendar automation service with mock implementation"""
     
     def __init__(self):
-        self.mock_events = []
+        self.mock_events: Dict[str, Dict[str, Any]] = {}
         logger.info("Calendar automation service initialized (mock mode)")
     
     def create_event(
@@ -30,7 +54,7 @@ class CalendarAutomation:
     ) -> Dict[str, Any]:
         """Create a calendar event"""
         try:
-            event_id = f"event_{hash(title + start_time)}"
+            event_id = f"event_{uuid.uuid4().hex}"
             
             event = {
                 'id': event_id,
@@ -42,7 +66,7 @@ class CalendarAutomation:
                 'calendar_id': calendar_id
             }
             
-            self.mock_events.append(event)
+            self.mock_events[event_id] = event
             
             return {
                 'success': True,
@@ -67,31 +91,22 @@ class CalendarAutomation:
     ) -> Dict[str, Any]:
         """List calendar events"""
         try:
-            events = self.mock_events if self.mock_events else [
-                {
-                    'id': 'event_1',
-                    'title': 'Team Meeting',
-                    'description': 'Weekly team sync',
-                    'start_time': '2024-01-15T10:00:00Z',
-                    'end_time': '2024-01-15T11:00:00Z',
-                    'attendees': ['user@example.com'],
-                    'location': 'Conference Room A'
-                },
-                {
-                    'id': 'event_2',
-                    'title': 'Project Review',
-                    'description': 'Quarterly project review',
-                    'start_time': '2024-01-16T14:00:00Z',
-                    'end_time': '2024-01-16T15:30:00Z',
-                    'attendees': ['manager@example.com'],
-                    'location': 'Meeting Room B'
-                }
-            ]
+            # islice rejects negative counts; treat them as "no events"
+            max_results = max(max_results, 0)
+            
+            if self.mock_events:
+                events = list(islice(self.mock_events.values(), max_results))
+            else:
+                # Copies, so callers cannot edit the shared defaults
+                events = [
+                    dict(event, attendees=list(event['attendees']))
+                    for event in _DEFAULT_MOCK_EVENTS[:max_results]
+                ]
             
             return {
                 'success': True,
-                'events': events[:max_results],
-                'count': len(events[:max_results]),
+                'events': events,
+                'count': len(events),
                 'calendar_id': calendar_id
             }
             
@@ -110,10 +125,9 @@ class CalendarAutomation:
     ) -> Dict[str, Any]:
         """Update a calendar event"""
         try:
-            for event in self.mock_events:
-                if event['id'] == event_id:
-                    event.update(updates)
-                    break
+            event = self.mock_events.get(event_id)
+            if event is not None:
+                event.update(updates)
             
             return {
                 'success': True,
@@ -136,7 +150,7 @@ class CalendarAutomation:
     ) -> Dict[str, Any]:
         """Delete a calendar event"""
         try:
-            self.mock_events = [e for e in self.mock_events if e['id'] != event_id]
+            self.mock_events.pop(event_id, None)
             
             return {
                 'success': True,
@@ -6,19 +6,264 @@ Handles email sending and reading operations
 import smtplib
 import imaplib
 import email
+import codecs
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
-from typing import Dict, Any, List, Optional
+from email.parser import BytesHeaderParser
+from typing import Dict, Any, Callable, List, Optional
 import os
+import re
+import queue
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 from app.core.config import settings
 
+try:
+    # SIMD base64 (AVX2/NEON) when available
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    from base64 import b64encode as _b64encode
+
 logger = logging.getLogger(__name__)
 
+# 57 raw bytes encode to exactly one 76-column base64 line (RFC 2045)
+_B64_LINE_BYTES = 57
+_B64_LINE_CHARS = 76
+_ATTACHMENT_READ_SIZE = _B64_LINE_BYTES * 1024
+
+# Previews only need the headers and the start of the body text
+_PREVIEW_LENGTH = 500
+_PREVIEW_FETCH_BYTES = 4096
+_PREVIEW_FETCH_SPEC = f'(BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{_PREVIEW_FETCH_BYTES}>)'
+_FULL_FETCH_SPEC = '(RFC822)'
+_HEADER_FETCH_SPEC = '(BODY.PEEK[HEADER])'
+_header_parser = BytesHeaderParser()
+
+# Decoder per charset label seen in mail; bounded since labels come from untrusted input
+_MAX_CACHED_DECODERS = 64
+_decoders: Dict[Optional[str], Callable] = {}
+
+
+def _decode_payload(payload: bytes, charset: Optional[str]) -> str:
+    """Decode a part payload using its declared charset, replacing invalid bytes"""
+    
+    decoder = _decoders.get(charset)
+    if decoder is None:
+        try:
+            decoder = codecs.lookup(charset or 'utf-8').decode
+        except LookupError:
+            # Unknown charset label
+            decoder = codecs.lookup('utf-8').decode
+        if len(_decoders) < _MAX_CACHED_DECODERS:
+            _decoders[charset] = decoder
+    return decoder(payload, 'replace')[0]
+
+# Literal item in a FETCH response, e.g. b'12 (BODY[HEADER] {342}' or b' BODY[TEXT]<0> {4096}'
+_FETCH_ITEM_RE = re.compile(rb'^\s*(?:(\d+) \()?.*?(RFC822|BODY\[[^\]]*\])(?:<\d+>)? \{\d+\}$')
+
+
+class _PooledSMTP:
+    """An authenticated SMTP session plus its message count"""
+    
+    __slots__ = ('server', 'sent', 'broken')
+    
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.broken = False
+
+
+class SMTPPool:
+    """Bounded pool of authenticated SMTP sessions with a per-connection message cap"""
+    
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        max_size: int = 5,
+        max_messages_per_conn: int = 100
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_messages_per_conn = max_messages_per_conn
+        self._idle: "queue.Queue[_PooledSMTP]" = queue.Queue(maxsize=max_size)
+        self._slots = threading.BoundedSemaphore(max_size)
+    
+    def _connect(self) -> _PooledSMTP:
+        server = smtplib.SMTP(self.host, self.port)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        return _PooledSMTP(server)
+    
+    @staticmethod
+    def _discard(conn: _PooledSMTP):
+        try:
+            conn.server.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.server.close()
+    
+    def acquire(self) -> _PooledSMTP:
+        """Check out a healthy session, opening a new one if none are idle"""
+        
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                try:
+                    conn.server.noop()
+                    return conn
+                except (smtplib.SMTPException, OSError):
+                    conn.server.close()
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def release(self, conn: _PooledSMTP):
+        """Return a session to the pool, retiring it once it hits the message cap"""
+        
+        try:
+            if conn.broken:
+                conn.server.close()
+            elif conn.sent >= self.max_messages_per_conn:
+                self._discard(conn)
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    self._discard(conn)
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        """Quit every idle session"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+_smtp_pools: Dict[tuple, SMTPPool] = {}
+_smtp_pools_lock = threading.Lock()
+
+
+def _get_smtp_pool(host: str, port: int, username: Optional[str], password: Optional[str]) -> SMTPPool:
+    """Return the process-wide pool for an SMTP account"""
+    
+    key = (host, port, username, password)
+    with _smtp_pools_lock:
+        pool = _smtp_pools.get(key)
+        if pool is None:
+            pool = SMTPPool(
+                host, port, username, password,
+                max_size=getattr(settings, 'SMTP_POOL_SIZE', 5),
+                max_messages_per_conn=getattr(settings, 'SMTP_MAX_MESSAGES_PER_CONNECTION', 100)
+            )
+            _smtp_pools[key] = pool
+        return pool
+
+
+class IMAPSession:
+    """A logged-in IMAP connection shared by every task in the process for one account
+    
+    IMAP commands on one connection cannot interleave, so callers use it
+    through checkout(), which holds the session lock for the whole exchange.
+    """
+    
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str]):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self._mail: Optional[imaplib.IMAP4_SSL] = None
+        self._selected_folder: Optional[str] = None
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def checkout(self, folder: Optional[str] = None):
+        """Hold the session and yield its client with `folder` selected"""
+        with self._lock:
+            yield self._connect(folder)
+    
+    def _connect(self, folder: Optional[str]) -> imaplib.IMAP4_SSL:
+        """Return the logged-in client, reconnecting if stale (caller holds _lock)"""
+        
+        if self._mail is not None:
+            try:
+                self._mail.noop()
+            except (imaplib.IMAP4.error, OSError):
+                self._drop()
+        
+        if self._mail is None:
+            mail = imaplib.IMAP4_SSL(self.host, self.port)
+            try:
+                mail.login(self.username, self.password)
+            except Exception:
+                mail.shutdown()
+                raise
+            self._mail = mail
+            self._selected_folder = None
+        
+        if folder is not None and self._selected_folder != folder:
+            status, _ = self._mail.select(folder)
+            self._selected_folder = folder if status == 'OK' else None
+        
+        return self._mail
+    
+    def _drop(self):
+        """Forget the connection without talking to the server (caller holds _lock)"""
+        mail, self._mail = self._mail, None
+        self._selected_folder = None
+        if mail is not None:
+            try:
+                mail.shutdown()
+            except OSError:
+                pass
+    
+    def close(self):
+        """Log out, if connected"""
+        with self._lock:
+            mail, self._mail = self._mail, None
+            self._selected_folder = None
+            if mail is None:
+                return
+            try:
+                mail.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+
+
+_imap_sessions: Dict[tuple, IMAPSession] = {}
+_imap_sessions_lock = threading.Lock()
+
+
+def _get_imap_session(host: str, port: int, username: Optional[str], password: Optional[str]) -> IMAPSession:
+    """Return the process-wide IMAP session for an account"""
+    
+    key = (host, port, username, password)
+    with _imap_sessions_lock:
+        session = _imap_sessions.get(key)
+        if session is None:
+            session = IMAPSession(host, port, username, password)
+            _imap_sessions[key] = session
+        return session
+
 
 class EmailAutomation:
     """Email automation service for sending and reading emails"""
@@ -33,6 +278,21 @@ class EmailAutomation:
         # These should be securely stored and retrieved
         self.email_address = getattr(settings, 'EMAIL_ADDRESS', None)
         self.email_password = getattr(settings, 'EMAIL_PASSWORD', None)
+        
+        # Shared SMTP connection pool for this server/account
+        self._smtp_pool = _get_smtp_pool(
+            self.smtp_server, self.smtp_port, self.email_address, self.email_password
+        )
+        
+        # Shared IMAP session for this server/account, reused across tasks
+        self._imap_session = _get_imap_session(
+            self.imap_server, self.imap_port, self.email_address, self.email_password
+        )
+    
+    def close(self):
+        """Release idle mail server connections"""
+        self._imap_session.close()
+        self._smtp_pool.close()
     
     def send_email(
         self,
@@ -51,40 +311,21 @@ class EmailAutomation:
                     'error': 'Email credentials not configured'
                 }
             
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.email_address
-            msg['To'] = to
-            msg['Subject'] = subject
-            
-            # Add body
-            if is_html:
-                msg.attach(MIMEText(body, 'html'))
-            else:
-                msg.attach(MIMEText(body, 'plain'))
-            
-            # Add attachments
-            if attachments:
-                for file_path in attachments:
-                    if os.path.exists(file_path):
-                        with open(file_path, 'rb') as attachment:
-                            part = MIMEBase('application', 'octet-stream')
-                            part.set_payload(attachment.read())
-                            encoders.encode_base64(part)
-                            part.add_header(
-                                'Content-Disposition',
-                                f'attachment; filename= {Path(file_path).name}'
-                            )
-                            msg.attach(part)
-                    else:
-                        logger.warning(f"Attachment not found: {file_path}")
+            text = self._build_message(to, subject, body, attachments, is_html)
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_address, self.email_password)
-                text = msg.as_string()
-                server.sendmail(self.email_address, to, text)
+            # Send email over a pooled session
+            conn = self._smtp_pool.acquire()
+            try:
+                conn.server.sendmail(self.email_address, to, text)
+                conn.sent += 1
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Server rejected this message; the session itself is still fine
+                raise
+            except OSError:
+                conn.broken = True
+                raise
+            finally:
+                self._smtp_pool.release(conn)
             
             return {
                 'success': True,
@@ -100,13 +341,164 @@ class EmailAutomation:
                 'error': str(e)
             }
     
+    def send_email_bulk(
+        self,
+        to_list: List[str],
+        subject: str,
+        body: str,
+        attachments: Optional[List[str]] = None,
+        is_html: bool = False
+    ) -> Dict[str, Any]:
+        """Send the same email to many recipients, building and encoding it once"""
+        
+        try:
+            if not self.email_address or not self.email_password:
+                return {
+                    'success': False,
+                    'error': 'Email credentials not configured'
+                }
+            
+            # Recipients are not disclosed to each other
+            text = self._build_message('undisclosed-recipients:;', subject, body, attachments, is_html)
+            
+            sent = []
+            failed = {}
+            conn = self._smtp_pool.acquire()
+            try:
+                for recipient in to_list:
+                    if conn.sent >= self._smtp_pool.max_messages_per_conn:
+                        self._smtp_pool.release(conn)
+                        conn = None
+                        conn = self._smtp_pool.acquire()
+                    
+                    try:
+                        conn.server.sendmail(self.email_address, recipient, text)
+                        conn.sent += 1
+                        sent.append(recipient)
+                    except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                        failed[recipient] = str(e)
+                    except OSError as e:
+                        # Session died; continue with the rest on a fresh one
+                        failed[recipient] = str(e)
+                        conn.broken = True
+                        self._smtp_pool.release(conn)
+                        conn = None
+                        conn = self._smtp_pool.acquire()
+            finally:
+                if conn is not None:
+                    self._smtp_pool.release(conn)
+            
+            for recipient, error in failed.items():
+                logger.warning(f"Failed to send email to {recipient}: {error}")
+            
+            return {
+                'success': not failed,
+                'message': f'Email sent to {len(sent)} of {len(to_list)} recipients',
+                'sent': sent,
+                'failed': failed,
+                'subject': subject
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to send bulk email: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _build_message(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        attachments: Optional[List[str]] = None,
+        is_html: bool = False
+    ) -> str:
+        """Build and serialise a MIME message with optional attachments"""
+        
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.email_address
+        msg['To'] = to
+        msg['Subject'] = subject
+        
+        # Add body
+        if is_html:
+            msg.attach(MIMEText(body, 'html'))
+        else:
+            msg.attach(MIMEText(body, 'plain'))
+        
+        # Add attachments
+        if attachments:
+            for file_path in attachments:
+                if os.path.exists(file_path):
+                    part = self._encode_attachment(file_path)
+                    part.add_header(
+                        'Content-Disposition',
+                        f'attachment; filename= {Path(file_path).name}'
+                    )
+                    msg.attach(part)
+                else:
+                    logger.warning(f"Attachment not found: {file_path}")
+        
+        return msg.as_string()
+    
+    @staticmethod
+    def _encode_attachment(file_path: str) -> MIMEBase:
+        """Base64-encode a file in line-aligned chunks into a pre-sized buffer"""
+        
+        size = os.path.getsize(file_path)
+        encoded_len = -(-size // 3) * 4
+        buffer = bytearray(encoded_len + -(-encoded_len // _B64_LINE_CHARS))  # plus one newline per line
+        out = memoryview(buffer)
+        pos = 0
+        
+        # One reusable read buffer; reading stops at the size measured above so
+        # the output buffer is filled exactly and never resized
+        chunk_buffer = bytearray(_ATTACHMENT_READ_SIZE)
+        chunk_view = memoryview(chunk_buffer)
+        remaining = size
+        
+        with open(file_path, 'rb') as attachment:
+            while remaining > 0:
+                n = attachment.readinto(chunk_view[:min(remaining, _ATTACHMENT_READ_SIZE)])
+                if not n:
+                    break
+                remaining -= n
+                encoded = memoryview(_b64encode(chunk_view[:n]))
+                for start in range(0, len(encoded), _B64_LINE_CHARS):
+                    line = encoded[start:start + _B64_LINE_CHARS]
+                    end = pos + len(line)
+                    out[pos:end] = line
+                    out[end] = 0x0A  # b'\n'
+                    pos = end + 1
+        out.release()
+        del buffer[pos:]  # file shrank while reading
+        
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(buffer.decode('ascii'))
+        part['Content-Transfer-Encoding'] = 'base64'
+        return part
+    
     def read_emails(
         self,
         limit: int = 10,
         unread_only: bool = True,
-        folder: str = 'INBOX'
+        folder: str = 'INBOX',
+        include_full_body: bool = False,
+        include_body: bool = True
     ) -> Dict[str, Any]:
-        """Read emails from the mailbox"""
+        """Read emails from the mailbox
+        
+        By default only the headers and the first few KB of each message body
+        are fetched (without setting \\Seen), which is enough for the preview.
+        Pass include_full_body=True to download full messages, or
+        include_body=False to fetch and parse headers only.
+        
+        Each email carries id/subject/from/date and a 'body' preview of at
+        most 500 characters; the untruncated text is only returned, as
+        'full_body', when include_full_body=True.
+        """
         
         try:
             if not self.email_address or not self.email_password:
@@ -115,11 +507,7 @@ class EmailAutomation:
                     'error': 'Email credentials not configured'
                 }
             
-            # Connect to IMAP server
-            with imaplib.IMAP4_SSL(self.imap_server, self.imap_port) as mail:
-                mail.login(self.email_address, self.email_password)
-                mail.select(folder)
-                
+            with self._imap_session.checkout(folder) as mail:
                 # Search for emails
                 search_criteria = '(UNSEEN)' if unread_only else 'ALL'
                 status, messages = mail.search(None, search_criteria)
@@ -135,28 +523,59 @@ class EmailAutomation:
                 message_ids = message_ids[-limit:] if len(message_ids) > limit else message_ids
                 
                 emails = []
-                for msg_id in reversed(message_ids):  # Most recent first
-                    status, msg_data = mail.fetch(msg_id, '(RFC822)')
+                if message_ids:
+                    # One FETCH round-trip for the whole batch
+                    if include_full_body:
+                        fetch_spec = _FULL_FETCH_SPEC
+                    elif include_body:
+                        fetch_spec = _PREVIEW_FETCH_SPEC
+                    else:
+                        fetch_spec = _HEADER_FETCH_SPEC
+                    status, msg_data = mail.fetch(b','.join(message_ids), fetch_spec)
+                    if status != 'OK':
+                        return {
+                            'success': False,
+                            'error': 'Failed to fetch emails'
+                        }
+                    
+                    sections = self._group_fetch_sections(msg_data)
                     
-                    if status == 'OK':
-                        email_message = email.message_from_bytes(msg_data[0][1])
+                    for msg_id in reversed(message_ids):  # Most recent first
+                        parts = sections.get(msg_id)
+                        if not parts:
+                            continue
+                        
+                        if include_full_body:
+                            raw = parts.get(b'RFC822')
+                        elif include_body:
+                            raw = parts.get(b'BODY[HEADER]', b'') + parts.get(b'BODY[TEXT]', b'')
+                        else:
+                            raw = parts.get(b'BODY[HEADER]')
+                        if not raw:
+                            continue
+                        
+                        if include_full_body or include_body:
+                            email_message = email.message_from_bytes(raw)
+                        else:
+                            # Headers only: skip MIME body parsing entirely
+                            email_message = _header_parser.parsebytes(raw)
                         
                         # Extract email content
-                        subject = email_message.get('Subject', '')
-                        sender = email_message.get('From', '')
-                        date = email_message.get('Date', '')
+                        entry = {
+                            'id': msg_id.decode(),
+                            'subject': email_message.get('Subject', ''),
+                            'from': email_message.get('From', ''),
+                            'date': email_message.get('Date', '')
+                        }
                         
                         # Get email body
-                        body = self._extract_email_body(email_message)
+                        if include_full_body or include_body:
+                            body = self._extract_email_body(email_message)
+                            entry['body'] = body[:_PREVIEW_LENGTH] + '...' if len(body) > _PREVIEW_LENGTH else body
+                            if include_full_body:
+                                entry['full_body'] = body
                         
-                        emails.append({
-                            'id': msg_id.decode(),
-                            'subject': subject,
-                            'from': sender,
-                            'date': date,
-                            'body': body[:500] + '...' if len(body) > 500 else body,
-                            'full_body': body
-                        })
+                        emails.append(entry)
             
             return {
                 'success': True,
@@ -172,38 +591,53 @@ class EmailAutomation:
                 'error': str(e)
             }
     
+    @staticmethod
+    def _group_fetch_sections(msg_data: list) -> Dict[bytes, Dict[bytes, bytes]]:
+        """Group a batched FETCH response into {message id: {section: literal}}"""
+        
+        sections: Dict[bytes, Dict[bytes, bytes]] = {}
+        current = None
+        for item in msg_data:
+            if not isinstance(item, tuple):
+                continue  # closing b')' of a message
+            match = _FETCH_ITEM_RE.match(item[0])
+            if match is None:
+                continue
+            if match.group(1) is not None:
+                current = sections.setdefault(match.group(1), {})
+            if current is not None:
+                current[match.group(2)] = item[1]
+        return sections
+    
     def _extract_email_body(self, email_message) -> str:
         """Extract plain text body from email message"""
         
-        body = ""
+        if not email_message.is_multipart():
+            payload = email_message.get_payload(decode=True)
+            if payload is None:
+                return str(email_message.get_payload())
+            return _decode_payload(payload, email_message.get_content_charset())
         
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    try:
-                        body = part.get_payload(decode=True).decode()
-                        break
-                    except:
-                        continue
-        else:
-            try:
-                body = email_message.get_payload(decode=True).decode()
-            except:
-                body = str(email_message.get_payload())
+        # Depth-first in document order, stopping at the first inline text/plain part
+        stack = [email_message]
+        while stack:
+            part = stack.pop()
+            if part.is_multipart():
+                stack.extend(reversed(part.get_payload()))
+                continue
+            
+            if part.get_content_type() == "text/plain" and "attachment" not in str(part.get("Content-Disposition")):
+                payload = part.get_payload(decode=True)
+                if payload is not None:
+                    return _decode_payload(payload, part.get_content_charset())
         
-        return body
+        return ""
     
     def mark_as_read(self, message_id: str, folder: str = 'INBOX') -> Dict[str, Any]:
         """Mark an email as read"""
         
         try:
-            with imaplib.IMAP4_SSL(self.imap_server, self.imap_port) as mail:
-                mail.login(self.email_address, self.email_password)
-                mail.select(folder)
-                
+            with self._imap_session.checkout(folder) as mail:
                 mail.store(message_id, '+FLAGS', '\\Seen')
                 
                 return {
@@ -222,10 +656,7 @@ class EmailAutomation:
         """Delete an email"""
         
         try:
-            with imaplib.IMAP4_SSL(self.imap_server, self.imap_port) as mail:
-                mail.login(self.email_address, self.email_password)
-                mail.select(folder)
-                
+            with self._imap_session.checkout(folder) as mail:
                 mail.store(message_id, '+FLAGS', '\\Deleted')
                 mail.expunge()
                 
@@ -245,9 +676,7 @@ class EmailAutomation:
         """Get list of email folders"""
         
         try:
-            with imaplib.IMAP4_SSL(self.imap_server, self.imap_port) as mail:
-                mail.login(self.email_address, self.email_password)
-                
+            with self._imap_session.checkout() as mail:
                 status, folders = mail.list()
                 
                 if status == 'OK':
@@ -4,19 +4,23 @@ Implements sandboxed Python script execution with security validation
 """
 
 import os
+import ast
 import sys
+import textwrap
+import heapq
 import tempfile
 import subprocess
 import asyncio
 import psutil
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
 import uuid
 import time
 import json
 import threading
+from collections import deque
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -48,18 +52,98 @@ class SecurityViolationError(Exception):
     pass
 
 
+# Interpreter that has already paid its startup cost and waits on stdin for
+# one line of JSON parameters followed by the script source
+_WORKER_BOOTSTRAP = (
+    "import json, sys, traceback\n"
+    "parameters = json.loads(sys.stdin.readline())\n"
+    "source = sys.stdin.read()\n"
+    "exec(compile(source, '<task>', 'exec'), {'__name__': '__main__', 'TASK_PARAMETERS': parameters})\n"
+)
+
+
+class PythonWorkerPool:
+    """Pool of pre-started Python interpreters for script tasks
+    
+    Each worker runs exactly one script and exits, so tasks never share
+    interpreter state; the pool only hides interpreter startup latency.
+    """
+    
+    def __init__(self, size: int, cwd: Path):
+        self.size = size
+        self.cwd = cwd
+        self._idle = deque()
+        self._lock = threading.Lock()
+    
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, '-c', _WORKER_BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd
+        )
+    
+    def acquire(self) -> subprocess.Popen:
+        """Take a warm worker (or start one if none is ready), then top the pool back up"""
+        
+        worker = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.poll() is None:
+                    worker = candidate
+                    break
+            
+            if worker is None:
+                worker = self._spawn()
+            
+            try:
+                while len(self._idle) < self.size:
+                    self._idle.append(self._spawn())
+            except OSError as e:
+                logger.warning(f"Could not start spare Python worker: {e}")
+        
+        return worker
+    
+    def shutdown(self):
+        """Kill all idle workers"""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.popleft()
+                worker.kill()
+                worker.wait()
+
+
+# running_tasks is split across this many independently locked dicts
+_TASK_SHARDS = 16
+
+
 class TaskExecutor:
     """Secure task execution engine with sandboxing"""
     
     def __init__(self):
         self.temp_dir = Path(tempfile.gettempdir()) / "charlie_tasks"
         self.temp_dir.mkdir(exist_ok=True)
-        self.running_tasks = {}
+        self._task_shards = [({}, threading.Lock()) for _ in range(_TASK_SHARDS)]
+        self._completion_heap: List[Tuple[float, str]] = []  # (end_time, task_id)
+        self._completion_lock = threading.Lock()
         
         # Security configuration
         self.max_execution_time = 300  # 5 minutes
         self.max_memory_mb = 512
         self.max_cpu_percent = 50
+        self.max_output_bytes = 1024 * 1024  # per stream; the rest is discarded
+        
+        # One sampler thread checks all running script processes
+        self.monitor_interval = 1.0
+        self._monitored: Dict[str, tuple] = {}
+        self._limit_errors: Dict[str, str] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_lock = threading.Lock()
+        
+        # Warm interpreters for python_script tasks (spawned lazily on first use)
+        self.python_workers = PythonWorkerPool(size=2, cwd=self.temp_dir)
         
         # Allowed modules for script execution
         self.allowed_modules = {
@@ -68,11 +152,11 @@ class TaskExecutor:
         }
         
         # Restricted operations
-        self.restricted_keywords = [
-            'import os', 'import sys', 'import subprocess', 'exec(',
-            'eval(', '__import__', 'compile(', 'open(', 'file(',
-            'input(', 'raw_input(', 'execfile(', 'reload('
-        ]
+        self.restricted_modules = frozenset({'os', 'sys', 'subprocess'})
+        self.restricted_builtins = frozenset({
+            'exec', 'eval', '__import__', 'compile', 'open', 'file',
+            'input', 'raw_input', 'execfile', 'reload'
+        })
 
     async def execute_task(
         self,
@@ -100,7 +184,9 @@ class TaskExecutor:
                 'security_level': security_level
             }
             
-            self.running_tasks[task_id] = task_context
+            tasks, lock = self._shard(task_id)
+            with lock:
+                tasks[task_id] = task_context
             
             # Execute based on task type
             if task_type == "python_script":
@@ -115,9 +201,10 @@ class TaskExecutor:
                 raise TaskExecutionError(f"Unknown task type: {task_type}")
             
             # Update task status
-            task_context['status'] = TaskStatus.COMPLETED
-            task_context['end_time'] = time.time()
-            task_context['result'] = result
+            with lock:
+                task_context['status'] = TaskStatus.COMPLETED
+                task_context['result'] = result
+                self._mark_finished(task_id, task_context)
             
             return {
                 'task_id': task_id,
@@ -128,29 +215,69 @@ class TaskExecutor:
             
         except Exception as e:
             logger.error(f"Task execution failed for {task_id}: {e}")
-            if task_id in self.running_tasks:
-                self.running_tasks[task_id]['status'] = TaskStatus.FAILED
-                self.running_tasks[task_id]['error'] = str(e)
+            tasks, lock = self._shard(task_id)
+            with lock:
+                task_info = tasks.get(task_id)
+                if task_info is not None:
+                    task_info['status'] = TaskStatus.FAILED
+                    task_info['error'] = str(e)
+                    self._mark_finished(task_id, task_info)
             
             raise TaskExecutionError(f"Task execution failed: {str(e)}")
 
     def _validate_security(self, script_content: str, security_level: SecurityLevel):
         """Validate script content for security violations"""
         
-        if security_level == SecurityLevel.RESTRICTED:
-            # Very strict validation
-            for keyword in self.restricted_keywords:
-                if keyword in script_content:
-                    raise SecurityViolationError(f"Restricted keyword found: {keyword}")
-        
-        # Check for potentially dangerous imports
-        lines = script_content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('import ') or line.startswith('from '):
-                module_name = line.split()[1].split('.')[0]
-                if module_name not in self.allowed_modules and security_level in [SecurityLevel.HIGH, SecurityLevel.RESTRICTED]:
-                    raise SecurityViolationError(f"Module not allowed: {module_name}")
+        if security_level not in (SecurityLevel.HIGH, SecurityLevel.RESTRICTED):
+            return
+        
+        # Scripts are spliced into an indented try block, so they may arrive indented
+        try:
+            tree = ast.parse(textwrap.dedent(script_content))
+        except SyntaxError as e:
+            raise SecurityViolationError(f"Script could not be parsed for validation: {e}")
+        
+        restricted = security_level == SecurityLevel.RESTRICTED
+        
+        for node in ast.walk(tree):
+            # Check for potentially dangerous imports
+            if isinstance(node, ast.Import):
+                module_names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                module_names = ['.' * node.level + (node.module or '')]
+            else:
+                module_names = None
+            
+            if module_names is not None:
+                for name in module_names:
+                    module_name = name.split('.')[0]
+                    if restricted and module_name in self.restricted_modules:
+                        raise SecurityViolationError(f"Restricted keyword found: import {module_name}")
+                    if module_name not in self.allowed_modules:
+                        raise SecurityViolationError(f"Module not allowed: {module_name or name}")
+            
+            # Very strict validation: any read of a dangerous builtin, whether
+            # by bare name, as an attribute (codecs.open, Path.open) or called
+            elif restricted:
+                name = self._restricted_name(node)
+                if name is not None:
+                    raise SecurityViolationError(f"Restricted keyword found: {name}")
+
+    def _restricted_name(self, node: ast.AST) -> Optional[str]:
+        """Name of the restricted builtin an AST node reaches, if any"""
+        
+        if isinstance(node, ast.Call):
+            node = node.func
+        
+        if isinstance(node, ast.Name):
+            # Assigning to e.g. `file` or `input` only shadows the builtin
+            if isinstance(node.ctx, ast.Load) and node.id in self.restricted_builtins:
+                return node.id
+        elif isinstance(node, ast.Attribute):
+            if node.attr in self.restricted_builtins:
+                return node.attr
+        
+        return None
 
     async def _execute_python_script(
         self,
@@ -161,19 +288,12 @@ class TaskExecutor:
     ) -> Dict[str, Any]:
         """Execute Python script in sandboxed environment"""
         
-        # Create temporary script file
-        script_file = self.temp_dir / f"task_{task_id}.py"
-        
-        try:
-            # Prepare script with parameters injection
-            full_script = f"""
+        # Prepare script; TASK_PARAMETERS is provided by the worker bootstrap
+        full_script = f"""
 import json
 import sys
 import traceback
 
-# Injected parameters
-TASK_PARAMETERS = {json.dumps(parameters)}
-
 try:
     # User script content
 {script_content}
@@ -191,57 +311,113 @@ except Exception as e:
     print(json.dumps(error_result))
     sys.exit(1)
 """
-            
-            # Write script to file
-            with open(script_file, 'w') as f:
-                f.write(full_script)
-            
-            # Execute script with resource limits
-            process = await asyncio.create_subprocess_exec(
-                sys.executable, str(script_file),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=self.temp_dir
-            )
-            
-            # Monitor resource usage
-            monitor_task = asyncio.create_task(
-                self._monitor_process(process, task_id)
+        
+        # Script goes to the interpreter over stdin; nothing touches the disk.
+        # Acquiring may spawn interpreters, so keep it off the event loop
+        worker = await asyncio.to_thread(self.python_workers.acquire)
+        return await self._run_in_worker(task_id, worker, full_script, parameters)
+
+    async def _run_in_worker(
+        self,
+        task_id: str,
+        worker: subprocess.Popen,
+        full_script: str,
+        parameters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Feed parameters and a script to a warm worker and collect its result"""
+        
+        # Parameters travel as data rather than being pasted into the source,
+        # so they never go through the Python tokenizer
+        payload = json.dumps(parameters).encode() + b'\n' + full_script.encode()
+        
+        self._watch_process(task_id, worker)
+        
+        try:
+            stdout, stderr, truncated = await asyncio.to_thread(
+                self._communicate_bounded, worker, payload
             )
-            
-            try:
-                # Wait for completion with timeout
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.max_execution_time
-                )
-                
-                monitor_task.cancel()
-                
-                # Parse result
-                try:
-                    result = json.loads(stdout.decode())
-                    if stderr:
-                        result['warnings'] = stderr.decode()
-                    return result
-                except json.JSONDecodeError:
-                    return {
-                        'success': False,
-                        'error': 'Invalid script output',
-                        'stdout': stdout.decode(),
-                        'stderr': stderr.decode()
-                    }
-                    
-            except asyncio.TimeoutError:
-                process.kill()
-                monitor_task.cancel()
-                raise TaskExecutionError("Script execution timeout")
-                
+        except subprocess.TimeoutExpired:
+            raise TaskExecutionError("Script execution timeout")
         finally:
-            # Cleanup
-            if script_file.exists():
-                script_file.unlink()
-
+            self._monitored.pop(task_id, None)
+        
+        limit_error = self._limit_errors.pop(task_id, None)
+        if limit_error:
+            raise TaskExecutionError(limit_error)
+        
+        result = self._parse_script_output(stdout, stderr)
+        if truncated:
+            result['output_truncated'] = True
+        return result
+    
+    def _communicate_bounded(
+        self,
+        worker: subprocess.Popen,
+        script: bytes
+    ) -> Tuple[bytes, bytes, bool]:
+        """Like Popen.communicate, but keeps at most max_output_bytes of each stream"""
+        
+        captured = {}
+        
+        def drain(name, stream):
+            buffer = bytearray()
+            total = 0
+            with stream:
+                while True:
+                    chunk = stream.read(65536)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    room = self.max_output_bytes - len(buffer)
+                    if room > 0:
+                        buffer += chunk[:room]
+            captured[name] = (buffer, total > self.max_output_bytes)
+        
+        readers = [
+            threading.Thread(target=drain, args=('stdout', worker.stdout), daemon=True),
+            threading.Thread(target=drain, args=('stderr', worker.stderr), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+        
+        try:
+            with worker.stdin:
+                worker.stdin.write(script)
+        except BrokenPipeError:
+            pass  # worker died early; its exit status and output tell the story
+        
+        try:
+            worker.wait(timeout=self.max_execution_time)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+            worker.wait()
+            raise
+        finally:
+            for reader in readers:
+                reader.join()
+        
+        stdout, stdout_truncated = captured['stdout']
+        stderr, stderr_truncated = captured['stderr']
+        return bytes(stdout), bytes(stderr), stdout_truncated or stderr_truncated
+    
+    @staticmethod
+    def _parse_script_output(stdout: bytes, stderr: bytes) -> Dict[str, Any]:
+        """Parse the JSON result printed by the script wrapper"""
+        
+        try:
+            # json.loads takes the raw bytes, so valid output is never decoded twice
+            result = json.loads(stdout)
+            if stderr:
+                result['warnings'] = stderr.decode(errors='replace')
+            return result
+        except ValueError:
+            return {
+                'success': False,
+                'error': 'Invalid script output',
+                'stdout': stdout.decode(errors='replace'),
+                'stderr': stderr.decode(errors='replace')
+            }
+    
     async def _execute_system_command(
         self,
         task_id: str,
@@ -288,61 +464,109 @@ except Exception as e:
         except asyncio.TimeoutError:
             raise TaskExecutionError("Command execution timeout")
 
-    async def _monitor_process(self, process: asyncio.subprocess.Process, task_id: str):
-        """Monitor process resource usage"""
+    def _watch_process(self, task_id: str, process: subprocess.Popen):
+        """Register a task process with the shared resource sampler"""
         
         try:
-            if process.pid:
-                psutil_process = psutil.Process(process.pid)
+            psutil_process = psutil.Process(process.pid)
+            psutil_process.cpu_percent(interval=None)  # prime; first reading is always 0
+        except psutil.NoSuchProcess:
+            return
+        
+        with self._sampler_lock:
+            self._monitored[task_id] = (psutil_process, process)
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample_processes, name="task-resource-sampler", daemon=True
+                )
+                self._sampler.start()
+    
+    def _sample_processes(self):
+        """Check every monitored task process once per interval; exits when none are left"""
+        
+        while True:
+            time.sleep(self.monitor_interval)
+            
+            with self._sampler_lock:
+                if not self._monitored:
+                    self._sampler = None
+                    return
+                monitored = list(self._monitored.items())
+            
+            for task_id, (psutil_process, process) in monitored:
+                try:
+                    # Check memory usage
+                    memory_mb = psutil_process.memory_info().rss / 1024 / 1024
+                    if memory_mb > self.max_memory_mb:
+                        self._limit_errors[task_id] = f"Memory limit exceeded: {memory_mb:.1f}MB"
+                        process.kill()
+                        self._monitored.pop(task_id, None)
+                        continue
+                    
+                    # Check CPU usage
+                    cpu_percent = psutil_process.cpu_percent(interval=None)
+                    if cpu_percent > self.max_cpu_percent:
+                        logger.warning(f"High CPU usage for task {task_id}: {cpu_percent}%")
                 
-                while process.returncode is None:
-                    try:
-                        # Check memory usage
-                        memory_info = psutil_process.memory_info()
-                        memory_mb = memory_info.rss / 1024 / 1024
-                        
-                        if memory_mb > self.max_memory_mb:
-                            process.kill()
-                            raise TaskExecutionError(f"Memory limit exceeded: {memory_mb}MB")
-                        
-                        # Check CPU usage
-                        cpu_percent = psutil_process.cpu_percent()
-                        if cpu_percent > self.max_cpu_percent:
-                            logger.warning(f"High CPU usage for task {task_id}: {cpu_percent}%")
-                        
-                        await asyncio.sleep(1)
-                        
-                    except psutil.NoSuchProcess:
-                        break
-                        
-        except Exception as e:
-            logger.error(f"Process monitoring error for task {task_id}: {e}")
+                except psutil.NoSuchProcess:
+                    self._monitored.pop(task_id, None)
+                except Exception as e:
+                    logger.error(f"Process monitoring error for task {task_id}: {e}")
+
+    def _shard(self, task_id: str) -> Tuple[Dict[str, Dict[str, Any]], threading.Lock]:
+        """Return the (tasks, lock) shard that owns a task id"""
+        return self._task_shards[hash(task_id) % _TASK_SHARDS]
+
+    @property
+    def running_tasks(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of all tracked tasks across shards"""
+        snapshot = {}
+        for tasks, lock in self._task_shards:
+            with lock:
+                snapshot.update(tasks)
+        return snapshot
 
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get status of a running task"""
-        return self.running_tasks.get(task_id)
+        tasks, lock = self._shard(task_id)
+        with lock:
+            return tasks.get(task_id)
 
     def cancel_task(self, task_id: str) -> bool:
         """Cancel a running task"""
-        if task_id in self.running_tasks:
-            self.running_tasks[task_id]['status'] = TaskStatus.CANCELLED
-            # In a real implementation, you'd also terminate the process
-            return True
+        tasks, lock = self._shard(task_id)
+        with lock:
+            if task_id in tasks:
+                tasks[task_id]['status'] = TaskStatus.CANCELLED
+                # In a real implementation, you'd also terminate the process
+                return True
         return False
 
+    def _mark_finished(self, task_id: str, task_context: Dict[str, Any]):
+        """Stamp a task's end time and queue it for age-based cleanup"""
+        end_time = time.time()
+        task_context['end_time'] = end_time
+        with self._completion_lock:
+            heapq.heappush(self._completion_heap, (end_time, task_id))
+
     def cleanup_completed_tasks(self, max_age_hours: int = 24):
         """Clean up old completed tasks"""
-        current_time = time.time()
-        to_remove = []
+        cutoff = time.time() - max_age_hours * 3600
+        heap = self._completion_heap
         
-        for task_id, task_info in self.running_tasks.items():
-            if 'end_time' in task_info:
-                age_hours = (current_time - task_info['end_time']) / 3600
-                if age_hours > max_age_hours:
-                    to_remove.append(task_id)
+        # Only expired entries are touched, oldest first
+        expired = []
+        with self._completion_lock:
+            while heap and heap[0][0] < cutoff:
+                expired.append(heapq.heappop(heap))
         
-        for task_id in to_remove:
-            del self.running_tasks[task_id]
+        for end_time, task_id in expired:
+            tasks, lock = self._shard(task_id)
+            with lock:
+                task_info = tasks.get(task_id)
+                # Skip entries superseded by a later run reusing the same task id
+                if task_info is not None and task_info.get('end_time') == end_time:
+                    del tasks[task_id]
 
 
 # Global executor instance
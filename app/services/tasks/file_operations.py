@@ -4,16 +4,210 @@ Handles secure file system operations with validation
 """
 
 import os
+import errno
+import stat as stat_module
 import shutil
 import logging
+import functools
+from time import monotonic
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import hashlib
 import mimetypes
 
 logger = logging.getLogger(__name__)
 
+# OpenSSL-backed, so SHA-NI / ARMv8 crypto extensions are used where present
+_FILE_HASH_ALGO = 'sha256'
+
+# Below this many allowed directories a single tuple startswith beats the trie
+_TRIE_MIN_DIRECTORIES = 16
+
+# Marks a trie node whose path is an allowed directory (never a real component)
+_ALLOWED = None
+
+# Short-lived memory of paths that were just found missing, so repeated probes
+# skip the stat; kept per process since FileOperations is built per task
+_MISSING_TTL = 0.5
+_MISSING_MAX_ENTRIES = 4096
+_missing_paths: Dict[str, float] = {}
+
+# Reads at least this large tell the kernel to read ahead aggressively
+_SEQUENTIAL_HINT_BYTES = 1 << 20
+
+# Permission strings ('644', '755', ...) for every rwx bit pattern
+_PERM_TABLE = tuple('%03o' % i for i in range(0o1000))
+
+
+def _path_components(abs_path: str) -> List[str]:
+    """Split a normalized absolute path into components, root first"""
+    return abs_path.rstrip(os.sep).split(os.sep)
+
+
+def _absolute_path(file_path: str) -> str:
+    """Normalized absolute path; only relative paths need getcwd"""
+    if os.path.isabs(file_path):
+        return os.path.normpath(file_path)
+    return os.path.normpath(os.path.join(os.getcwd(), file_path))
+
+
+def _is_known_missing(abs_path: str) -> bool:
+    deadline = _missing_paths.get(abs_path)
+    return deadline is not None and deadline > monotonic()
+
+
+def _remember_missing(abs_path: str):
+    if len(_missing_paths) >= _MISSING_MAX_ENTRIES:
+        _missing_paths.clear()
+    _missing_paths[abs_path] = monotonic() + _MISSING_TTL
+
+
+def _forget_missing(*paths: str):
+    for path in paths:
+        _missing_paths.pop(_absolute_path(path), None)
+
+
+def _ensure_parent_dir(path: str):
+    """Create the parent directories of a file path if they don't exist"""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+def _with_parent_dir(operation, source: str, destination: str):
+    """Run operation(source, destination), creating missing parent directories
+    
+    The parent is only created after the operation fails, so the common case
+    costs no extra stat calls. A missing source is re-raised untouched.
+    """
+    try:
+        operation(source, destination)
+    except FileNotFoundError:
+        if not os.path.lexists(source):
+            raise
+        _ensure_parent_dir(destination)
+        operation(source, destination)
+
+
+# copy_file_range errors that mean "not supported here", not a real failure
+_COPY_RANGE_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ETXTBSY}
+
+
+def _copy_file(source: str, destination: str):
+    """shutil.copy2 with an in-kernel copy_file_range fast path
+    
+    On Linux the data never passes through user space, and copy-on-write
+    filesystems (btrfs, XFS) can share extents instead of copying them.
+    Elsewhere, or when the kernel refuses, falls back to shutil.copy2,
+    which already uses the platform's native copy primitive.
+    """
+    copy_range = getattr(os, 'copy_file_range', None)
+    if copy_range is not None:
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+        if not (os.path.exists(destination) and os.path.samefile(source, destination)):
+            try:
+                with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                    src_fd, dst_fd = src.fileno(), dst.fileno()
+                    while copy_range(src_fd, dst_fd, 1 << 30):
+                        pass
+                shutil.copystat(source, destination)
+                return
+            except OSError as e:
+                if e.errno not in _COPY_RANGE_UNSUPPORTED:
+                    raise
+    
+    shutil.copy2(source, destination)
+
+
+def _read_exact(file_path: str, size: int) -> bytearray:
+    """Read a whole file into a buffer pre-sized from its stat, in as few syscalls as possible"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    filled = 0
+    with open(file_path, 'rb', buffering=0) as f:
+        if size >= _SEQUENTIAL_HINT_BYTES and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while filled < size:
+            n = f.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        view.release()
+        del buffer[filled:]  # file shrank since the stat
+        rest = f.read()  # or grew
+        if rest:
+            buffer += rest
+    return buffer
+
+
+@functools.lru_cache(maxsize=2048)
+def _guess_mime_for_ext(extension: str) -> Optional[str]:
+    return mimetypes.guess_type('x' + extension)[0]
+
+
+def _guess_mime(file_path: str) -> Optional[str]:
+    """mimetypes.guess_type()[0], memoized per lowercased extension"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in mimetypes.encodings_map or extension in mimetypes.suffix_map:
+        # Compound suffixes (.tar.gz, .tgz) depend on more than the last extension
+        return mimetypes.guess_type(file_path)[0]
+    return _guess_mime_for_ext(extension)
+
+
+def _write_text(file_path, content: str, exclusive: bool = False) -> int:
+    """Write text as UTF-8 with platform newlines, encoding it once; returns bytes written
+    
+    With exclusive=True the file must not exist yet (FileExistsError otherwise).
+    """
+    data = content.encode('utf-8')
+    if os.linesep != '\n':
+        data = data.replace(b'\n', os.linesep.encode())
+    # Unbuffered: the encoded bytes go straight to write(2), never through
+    # a BufferedWriter copy; raw writes may be partial, hence the loop
+    with open(file_path, 'xb' if exclusive else 'wb', buffering=0) as f:
+        view = memoryview(data)
+        written = 0
+        while written < len(data):
+            written += f.write(view[written:])
+        view.release()
+    return len(data)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_path_trie(directories: Tuple[str, ...]) -> Dict:
+    """Build a component-wise trie of allowed directories"""
+    trie: Dict = {}
+    for directory in directories:
+        node = trie
+        for part in _path_components(os.path.normpath(directory)):
+            node = node.setdefault(part, {})
+        node[_ALLOWED] = True
+    return trie
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_allowed(abs_path: str, allowed: Tuple[str, ...]) -> bool:
+    """Whether a normalized absolute path lies in one of the allowed directories
+    
+    Pure string logic, so results are memoized; keying on the allow-list
+    tuple means a different allow-list never sees stale answers.
+    """
+    if len(allowed) < _TRIE_MIN_DIRECTORIES:
+        # One C-level call tests every separator-terminated prefix
+        return os.path.join(abs_path, '').startswith(allowed)
+    
+    # Walk the trie and accept at the first allowed ancestor
+    node = _build_path_trie(allowed)
+    for part in _path_components(abs_path):
+        node = node.get(part)
+        if node is None:
+            return False
+        if _ALLOWED in node:
+            return True
+    return False
+
 
 class FileOperations:
     """Secure file operations service"""
@@ -27,11 +221,19 @@ class FileOperations:
             str(Path.cwd()),  # Current working directory
         ]
         
+        # Absolute allowed prefixes, resolved once; the trailing separator keeps
+        # e.g. ~/Documents2 from matching ~/Documents
+        self._allowed_abs = tuple(
+            os.path.join(os.path.abspath(d), '') for d in self.allowed_directories
+        )
+        # Validator specialized to those prefixes once, instead of per call
+        self._path_allowed = functools.partial(_is_allowed, allowed=self._allowed_abs)
+        
         # Define restricted file extensions
-        self.restricted_extensions = {
+        self.restricted_extensions = frozenset({
             '.exe', '.bat', '.cmd', '.com', '.scr', '.pif',
             '.sys', '.dll', '.msi', '.vbs', '.js', '.jar'
-        }
+        })
         
         # Maximum file size (100MB)
         self.max_file_size = 100 * 1024 * 1024
@@ -39,14 +241,8 @@ class FileOperations:
     def _validate_path(self, file_path: str) -> bool:
         """Validate if file path is allowed"""
         try:
-            abs_path = os.path.abspath(file_path)
-            
             # Check if path is within allowed directories
-            for allowed_dir in self.allowed_directories:
-                if abs_path.startswith(os.path.abspath(allowed_dir)):
-                    return True
-            
-            return False
+            return self._path_allowed(_absolute_path(file_path))
             
         except Exception as e:
             logger.error(f"Path validation error: {e}")
@@ -54,8 +250,12 @@ class FileOperations:
     
     def _validate_file_extension(self, file_path: str) -> bool:
         """Validate file extension"""
-        extension = Path(file_path).suffix.lower()
-        return extension not in self.restricted_extensions
+        i = file_path.rfind('.')
+        if i < 0:
+            return True
+        # Only the tail is lowered; a dot in a directory name leaves a tail
+        # containing a separator, which never matches a restricted extension
+        return file_path[i:].lower() not in self.restricted_extensions
     
     def create_file(self, path: str, content: str = "") -> Dict[str, Any]:
         """Create a new file with content"""
@@ -72,27 +272,26 @@ class FileOperations:
                     'error': 'File extension not allowed'
                 }
             
-            file_path = Path(path)
+            file_path = path
             
             # Create parent directories if they don't exist
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            _ensure_parent_dir(file_path)
             
-            # Check if file already exists
-            if file_path.exists():
+            # Write content to file; the exclusive open doubles as the existence check
+            try:
+                size = _write_text(file_path, content, exclusive=True)
+            except FileExistsError:
                 return {
                     'success': False,
                     'error': 'File already exists'
                 }
-            
-            # Write content to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            _forget_missing(file_path)
             
             return {
                 'success': True,
                 'message': f'File created: {path}',
-                'path': str(file_path),
-                'size': len(content.encode('utf-8'))
+                'path': file_path,
+                'size': size
             }
             
         except Exception as e:
@@ -111,52 +310,61 @@ class FileOperations:
                     'error': 'File path not allowed'
                 }
             
-            file_path = Path(path)
+            file_path = path
+            abs_path = _absolute_path(file_path)
             
-            if not file_path.exists():
+            if _is_known_missing(abs_path):
                 return {
                     'success': False,
                     'error': 'File does not exist'
                 }
             
-            if not file_path.is_file():
+            # One stat answers existence, type and size
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                _remember_missing(abs_path)
+                return {
+                    'success': False,
+                    'error': 'File does not exist'
+                }
+            
+            if not stat_module.S_ISREG(stat.st_mode):
                 return {
                     'success': False,
                     'error': 'Path is not a file'
                 }
             
             # Check file size
-            file_size = file_path.stat().st_size
+            file_size = stat.st_size
             if file_size > self.max_file_size:
                 return {
                     'success': False,
                     'error': f'File too large: {file_size} bytes'
                 }
             
-            # Read file content
+            # Read file content once into a buffer sized from the stat
+            data = _read_exact(file_path, file_size)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
+                # Same result as text mode with universal newlines
+                content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                
                 return {
                     'success': True,
                     'content': content,
-                    'path': str(file_path),
+                    'path': file_path,
                     'size': file_size,
-                    'mime_type': mimetypes.guess_type(str(file_path))[0]
+                    'mime_type': _guess_mime(file_path)
                 }
                 
             except UnicodeDecodeError:
-                # Try reading as binary for non-text files
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                    
+                # Non-text file: reuse the bytes already read
                 return {
                     'success': True,
-                    'content': content.hex(),  # Return as hex string
-                    'path': str(file_path),
+                    'content': data.hex(),  # Return as hex string
+                    'path': file_path,
                     'size': file_size,
-                    'mime_type': mimetypes.guess_type(str(file_path))[0],
+                    'mime_type': _guess_mime(file_path),
                     'binary': True
                 }
             
@@ -182,20 +390,20 @@ class FileOperations:
                     'error': 'File extension not allowed'
                 }
             
-            file_path = Path(path)
+            file_path = path
             
             # Create parent directories if they don't exist
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            _ensure_parent_dir(file_path)
             
             # Write content to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            size = _write_text(file_path, content)
+            _forget_missing(file_path)
             
             return {
                 'success': True,
                 'message': f'File written: {path}',
-                'path': str(file_path),
-                'size': len(content.encode('utf-8'))
+                'path': file_path,
+                'size': size
             }
             
         except Exception as e:
@@ -214,27 +422,30 @@ class FileOperations:
                     'error': 'File path not allowed'
                 }
             
-            file_path = Path(path)
+            file_path = path
             
-            if not file_path.exists():
+            # Delete the file; the syscall itself reports a missing path or a directory
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
                 return {
                     'success': False,
                     'error': 'File does not exist'
                 }
-            
-            if not file_path.is_file():
+            except (IsADirectoryError, PermissionError):
+                # Windows and macOS report a directory as a permission error
+                if not os.path.isdir(file_path):
+                    raise
                 return {
                     'success': False,
                     'error': 'Path is not a file'
                 }
-            
-            # Delete the file
-            file_path.unlink()
+            _forget_missing(file_path)
             
             return {
                 'success': True,
                 'message': f'File deleted: {path}',
-                'path': str(file_path)
+                'path': file_path
             }
             
         except Exception as e:
@@ -244,8 +455,12 @@ class FileOperations:
                 'error': str(e)
             }
     
-    def list_directory(self, path: str = ".") -> Dict[str, Any]:
-        """List contents of a directory"""
+    def list_directory(self, path: str = ".", columnar: bool = False) -> Dict[str, Any]:
+        """List contents of a directory
+        
+        With columnar=True the entries come back as one list per field under
+        'columns' instead of one dict per entry under 'items'.
+        """
         try:
             if not self._validate_path(path):
                 return {
@@ -253,42 +468,66 @@ class FileOperations:
                     'error': 'Directory path not allowed'
                 }
             
-            dir_path = Path(path)
+            dir_path = path
             
-            if not dir_path.exists():
+            # opendir itself reports a missing path or a non-directory
+            try:
+                entries = os.scandir(dir_path)
+            except FileNotFoundError:
                 return {
                     'success': False,
                     'error': 'Directory does not exist'
                 }
-            
-            if not dir_path.is_dir():
+            except NotADirectoryError:
                 return {
                     'success': False,
                     'error': 'Path is not a directory'
                 }
             
-            items = []
-            for item in dir_path.iterdir():
-                try:
-                    stat = item.stat()
-                    items.append({
-                        'name': item.name,
-                        'path': str(item),
-                        'type': 'directory' if item.is_dir() else 'file',
-                        'size': stat.st_size if item.is_file() else None,
-                        'modified': stat.st_mtime,
-                        'permissions': oct(stat.st_mode)[-3:]
-                    })
-                except (PermissionError, OSError):
-                    # Skip items we can't access
-                    continue
+            # Collected column-wise: no per-entry dict until one is asked for
+            names, paths, types, sizes, mtimes, perms = [], [], [], [], [], []
+            # scandir entries carry the file type from readdir and cache their
+            # stat, so each entry costs at most one stat call
+            with entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except (PermissionError, OSError):
+                        # Skip items we can't access
+                        continue
+                    mode = stat.st_mode
+                    names.append(entry.name)
+                    paths.append(entry.path)
+                    types.append('directory' if stat_module.S_ISDIR(mode) else 'file')
+                    sizes.append(stat.st_size if stat_module.S_ISREG(mode) else None)
+                    mtimes.append(stat.st_mtime)
+                    perms.append(_PERM_TABLE[mode & 0o777])
             
             # Sort items: directories first, then files
-            items.sort(key=lambda x: (x['type'] == 'file', x['name'].lower()))
+            order = sorted(range(len(names)), key=lambda i: (types[i] == 'file', names[i].lower()))
+            columns = {
+                'name': [names[i] for i in order],
+                'path': [paths[i] for i in order],
+                'type': [types[i] for i in order],
+                'size': [sizes[i] for i in order],
+                'modified': [mtimes[i] for i in order],
+                'permissions': [perms[i] for i in order]
+            }
+            
+            if columnar:
+                return {
+                    'success': True,
+                    'path': dir_path,
+                    'columns': columns,
+                    'count': len(order)
+                }
+            
+            keys = tuple(columns)
+            items = [dict(zip(keys, row)) for row in zip(*columns.values())]
             
             return {
                 'success': True,
-                'path': str(dir_path),
+                'path': dir_path,
                 'items': items,
                 'count': len(items)
             }
@@ -309,32 +548,33 @@ class FileOperations:
                     'error': 'File path not allowed'
                 }
             
-            source_path = Path(source)
-            dest_path = Path(destination)
+            source_path = source
+            dest_path = destination
             
-            if not source_path.exists():
+            # Copy the file; opening the source reports a missing path or a directory
+            try:
+                _with_parent_dir(_copy_file, source_path, dest_path)
+            except FileNotFoundError:
                 return {
                     'success': False,
                     'error': 'Source file does not exist'
                 }
-            
-            if not source_path.is_file():
+            except (IsADirectoryError, PermissionError):
+                # Windows reports opening a directory as a permission error
+                if not os.path.isdir(source_path):
+                    raise
                 return {
                     'success': False,
                     'error': 'Source is not a file'
                 }
-            
-            # Create destination directory if it doesn't exist
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Copy the file
-            shutil.copy2(source_path, dest_path)
+            # The destination may be a directory the file landed inside
+            _forget_missing(dest_path, os.path.join(dest_path, os.path.basename(source_path)))
             
             return {
                 'success': True,
                 'message': f'File copied from {source} to {destination}',
-                'source': str(source_path),
-                'destination': str(dest_path)
+                'source': source_path,
+                'destination': dest_path
             }
             
         except Exception as e:
@@ -353,32 +593,34 @@ class FileOperations:
                     'error': 'File path not allowed'
                 }
             
-            source_path = Path(source)
-            dest_path = Path(destination)
+            source_path = source
+            dest_path = destination
             
-            if not source_path.exists():
+            # rename() would happily move a directory, so the source still needs
+            # one stat to confirm it is a regular file
+            try:
+                source_mode = os.stat(source_path).st_mode
+            except FileNotFoundError:
                 return {
                     'success': False,
                     'error': 'Source file does not exist'
                 }
             
-            if not source_path.is_file():
+            if not stat_module.S_ISREG(source_mode):
                 return {
                     'success': False,
                     'error': 'Source is not a file'
                 }
             
-            # Create destination directory if it doesn't exist
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            
             # Move the file
-            shutil.move(str(source_path), str(dest_path))
+            _with_parent_dir(shutil.move, source_path, dest_path)
+            _forget_missing(dest_path, os.path.join(dest_path, os.path.basename(source_path)))
             
             return {
                 'success': True,
                 'message': f'File moved from {source} to {destination}',
-                'source': str(source_path),
-                'destination': str(dest_path)
+                'source': source_path,
+                'destination': dest_path
             }
             
         except Exception as e:
@@ -397,37 +639,48 @@ class FileOperations:
                     'error': 'File path not allowed'
                 }
             
-            file_path = Path(path)
+            file_path = path
+            abs_path = _absolute_path(file_path)
             
-            if not file_path.exists():
+            if _is_known_missing(abs_path):
                 return {
                     'success': False,
                     'error': 'File does not exist'
                 }
             
-            stat = file_path.stat()
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                _remember_missing(abs_path)
+                return {
+                    'success': False,
+                    'error': 'File does not exist'
+                }
+            is_file = stat_module.S_ISREG(stat.st_mode)
             
             # Calculate file hash for integrity
             file_hash = None
-            if file_path.is_file() and stat.st_size < 10 * 1024 * 1024:  # Only for files < 10MB
+            if is_file and stat.st_size < 10 * 1024 * 1024:  # Only for files < 10MB
                 try:
-                    with open(file_path, 'rb') as f:
-                        file_hash = hashlib.md5(f.read()).hexdigest()
-                except:
+                    # Hashed in chunks by hashlib, never loading the whole file
+                    with open(file_path, 'rb', buffering=0) as f:
+                        file_hash = hashlib.file_digest(f, _FILE_HASH_ALGO).hexdigest()
+                except OSError:
                     pass
             
             return {
                 'success': True,
-                'path': str(file_path),
-                'name': file_path.name,
-                'type': 'directory' if file_path.is_dir() else 'file',
+                'path': file_path,
+                'name': os.path.basename(os.path.normpath(file_path)),
+                'type': 'directory' if stat_module.S_ISDIR(stat.st_mode) else 'file',
                 'size': stat.st_size,
                 'created': stat.st_ctime,
                 'modified': stat.st_mtime,
                 'accessed': stat.st_atime,
-                'permissions': oct(stat.st_mode)[-3:],
-                'mime_type': mimetypes.guess_type(str(file_path))[0] if file_path.is_file() else None,
-                'hash': file_hash
+                'permissions': _PERM_TABLE[stat.st_mode & 0o777],
+                'mime_type': _guess_mime(file_path) if is_file else None,
+                'hash': file_hash,
+                'hash_algo': _FILE_HASH_ALGO if file_hash else None
             }
             
         except Exception as e:
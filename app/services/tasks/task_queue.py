@@ -4,11 +4,15 @@ Handles async task processing with Redis broker
 """
 
 import logging
+import os
 import uuid
-from typing import Dict, Any, Optional
-from celery import Celery
+from typing import Dict, Any, Optional, List, Tuple
+from celery import Celery, group
+from celery.exceptions import Ignore
 from celery.result import AsyncResult
+from celery.signals import worker_process_init, worker_process_shutdown
 import asyncio
+import redis
 
 from app.core.config import settings
 from app.services.tasks.execution_engine import task_executor, SecurityLevel
@@ -35,16 +39,80 @@ celery_app.conf.update(
         "app.services.tasks.task_queue.execute_script_task": {"queue": "scripts"},
         "app.services.tasks.task_queue.execute_email_task": {"queue": "email"},
         "app.services.tasks.task_queue.execute_file_task": {"queue": "files"},
+        "app.services.tasks.task_queue.execute_file_batch_task": {"queue": "files"},
         "app.services.tasks.task_queue.execute_app_control_task": {"queue": "system"},
     },
     worker_prefetch_multiplier=1,
     task_acks_late=True,
 )
 
+# Cancellation flags: one Redis key per cancelled task, checked when it starts
+_CANCEL_KEY_PREFIX = "cancel:"
+_CANCEL_FLAG_TTL = 3600
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    """Shared Redis client for cancellation flags"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def _start_unless_cancelled(task) -> None:
+    """Mark the task PROCESSING, or REVOKED and stop it if it was cancelled
+    
+    The state is written before the flag is read, while cancel_task sets the
+    flag before reading the state: either this check sees the flag or
+    cancel_task sees PROCESSING and revokes the running task.
+    """
+    task.update_state(state="PROCESSING", meta={"progress": 0})
+    
+    try:
+        cancelled = _get_redis().exists(_CANCEL_KEY_PREFIX + task.request.id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not check cancellation flag: {e}")
+        return
+    
+    if cancelled:
+        task.update_state(state="REVOKED", meta={"error": "Task cancelled", "progress": 0})
+        raise Ignore()
+
+
+# Event loop shared by every script task run in this worker process
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the worker's event loop, creating it if the init signal did not fire"""
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_LOOP)
+    return _LOOP
+
+
+@worker_process_init.connect
+def _init_worker_loop(**kwargs):
+    """Create the per-process event loop when a pool worker starts"""
+    _get_event_loop()
+
+
+@worker_process_shutdown.connect
+def _close_worker_loop(**kwargs):
+    """Close the per-process event loop when a pool worker exits"""
+    global _LOOP
+    if _LOOP is not None and not _LOOP.is_closed():
+        _LOOP.close()
+    _LOOP = None
+
 
 @celery_app.task(bind=True, name="execute_script_task")
 def execute_script_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute Python script task"""
+    _start_unless_cancelled(self)
+    
     try:
         task_id = task_data.get("task_id", str(uuid.uuid4()))
         script_content = task_data.get("script_content", "")
@@ -52,30 +120,20 @@ def execute_script_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         security_level = SecurityLevel(task_data.get("security_level", "medium"))
         user_id = task_data.get("user_id")
         
-        # Update task status
-        self.update_state(state="PROCESSING", meta={"progress": 0})
-        
-        # Execute script using asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(
-                task_executor.execute_task(
-                    task_id=task_id,
-                    task_type="python_script",
-                    script_content=script_content,
-                    parameters=parameters,
-                    security_level=security_level,
-                    user_id=user_id
-                )
+        # Execute script on the worker's long-lived event loop
+        result = _get_event_loop().run_until_complete(
+            task_executor.execute_task(
+                task_id=task_id,
+                task_type="python_script",
+                script_content=script_content,
+                parameters=parameters,
+                security_level=security_level,
+                user_id=user_id
             )
-            
-            self.update_state(state="SUCCESS", meta={"progress": 100, "result": result})
-            return result
-            
-        finally:
-            loop.close()
+        )
+        
+        self.update_state(state="SUCCESS", meta={"progress": 100, "result": result})
+        return result
             
     except Exception as e:
         logger.error(f"Script task execution failed: {e}")
@@ -89,11 +147,11 @@ def execute_script_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
 @celery_app.task(bind=True, name="execute_email_task")
 def execute_email_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute email automation task"""
+    _start_unless_cancelled(self)
+    
     try:
         from app.services.tasks.email_automation import EmailAutomation
         
-        self.update_state(state="PROCESSING", meta={"progress": 0})
-        
         email_service = EmailAutomation()
         
         action = task_data.get("action", "send")
@@ -126,43 +184,50 @@ def execute_email_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         raise
 
 
+def _dispatch_file_operation(file_service, operation: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Route one file operation to the matching FileOperations method"""
+    if operation == "create":
+        return file_service.create_file(
+            path=parameters.get("path"),
+            content=parameters.get("content", "")
+        )
+    elif operation == "read":
+        return file_service.read_file(
+            path=parameters.get("path")
+        )
+    elif operation == "write":
+        return file_service.write_file(
+            path=parameters.get("path"),
+            content=parameters.get("content")
+        )
+    elif operation == "delete":
+        return file_service.delete_file(
+            path=parameters.get("path")
+        )
+    elif operation == "list":
+        return file_service.list_directory(
+            path=parameters.get("path", "."),
+            columnar=parameters.get("columnar", False)
+        )
+    else:
+        raise ValueError(f"Unknown file operation: {operation}")
+
+
 @celery_app.task(bind=True, name="execute_file_task")
 def execute_file_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute file system operation task"""
+    _start_unless_cancelled(self)
+    
     try:
         from app.services.tasks.file_operations import FileOperations
         
-        self.update_state(state="PROCESSING", meta={"progress": 0})
-        
         file_service = FileOperations()
         
-        operation = task_data.get("operation")
-        parameters = task_data.get("parameters", {})
-        
-        if operation == "create":
-            result = file_service.create_file(
-                path=parameters.get("path"),
-                content=parameters.get("content", "")
-            )
-        elif operation == "read":
-            result = file_service.read_file(
-                path=parameters.get("path")
-            )
-        elif operation == "write":
-            result = file_service.write_file(
-                path=parameters.get("path"),
-                content=parameters.get("content")
-            )
-        elif operation == "delete":
-            result = file_service.delete_file(
-                path=parameters.get("path")
-            )
-        elif operation == "list":
-            result = file_service.list_directory(
-                path=parameters.get("path", ".")
-            )
-        else:
-            raise ValueError(f"Unknown file operation: {operation}")
+        result = _dispatch_file_operation(
+            file_service,
+            task_data.get("operation"),
+            task_data.get("parameters", {})
+        )
         
         self.update_state(state="SUCCESS", meta={"progress": 100, "result": result})
         return result
@@ -176,14 +241,109 @@ def execute_file_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         raise
 
 
+def _related_paths(a: str, b: str) -> bool:
+    """Whether two normalized paths are the same or one contains the other"""
+    if a == b:
+        return True
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return longer.startswith(shorter.rstrip(os.sep) + os.sep)
+
+
+def _batch_lanes(ops: List[Dict[str, Any]]) -> List[List[int]]:
+    """Split batch ops into lanes that may run concurrently
+    
+    Ops touching the same path, or a path and its ancestor (e.g. create X,
+    write X, read X, list X's directory), share a lane and run in submitted
+    order; unrelated ops get lanes of their own.
+    """
+    paths = [
+        os.path.normpath(os.path.abspath(os.path.expanduser(
+            op.get("parameters", {}).get("path") or "."
+        )))
+        for op in ops
+    ]
+    
+    # Union-find over op indexes; batches are small, so pairwise is fine
+    parent = list(range(len(ops)))
+    
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for i in range(len(ops)):
+        for j in range(i):
+            if _related_paths(paths[i], paths[j]):
+                parent[find(i)] = find(j)
+    
+    lanes: Dict[int, List[int]] = {}
+    for i in range(len(ops)):
+        lanes.setdefault(find(i), []).append(i)
+    return list(lanes.values())
+
+
+@celery_app.task(bind=True, name="execute_file_batch_task")
+def execute_file_batch_task(self, task_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute several file operations in one task, overlapping their blocking I/O
+    
+    Ops on unrelated paths run concurrently; ops on the same path (or nested
+    paths) run one after another in the order given.
+    """
+    _start_unless_cancelled(self)
+    
+    try:
+        from app.services.tasks.file_operations import FileOperations
+        
+        file_service = FileOperations()
+        ops = task_data.get("ops", [])
+        
+        outcomes: List[Any] = [None] * len(ops)
+        
+        async def run_lane(lane: List[int]):
+            for index in lane:
+                op = ops[index]
+                try:
+                    outcomes[index] = await asyncio.to_thread(
+                        _dispatch_file_operation,
+                        file_service,
+                        op.get("operation"),
+                        op.get("parameters", {})
+                    )
+                except Exception as e:
+                    outcomes[index] = e
+        
+        async def run_all():
+            await asyncio.gather(*(run_lane(lane) for lane in _batch_lanes(ops)))
+        
+        _get_event_loop().run_until_complete(run_all())
+        
+        # One result per op, in order; a bad op fails alone
+        result = [
+            {'success': False, 'error': str(outcome)} if isinstance(outcome, Exception) else outcome
+            for outcome in outcomes
+        ]
+        
+        self.update_state(state="SUCCESS", meta={"progress": 100, "result": result})
+        return result
+        
+    except Exception as e:
+        logger.error(f"File batch task execution failed: {e}")
+        self.update_state(
+            state="FAILURE",
+            meta={"error": str(e), "progress": 0}
+        )
+        raise
+
+
 @celery_app.task(bind=True, name="execute_app_control_task")
 def execute_app_control_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute application control task (Windows-specific)"""
+    _start_unless_cancelled(self)
+    
     try:
         from app.services.tasks.app_control import AppControl
         
-        self.update_state(state="PROCESSING", meta={"progress": 0})
-        
         app_control = AppControl()
         
         action = task_data.get("action")
@@ -222,11 +382,11 @@ def execute_app_control_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
 @celery_app.task(bind=True, name="execute_calendar_task")
 def execute_calendar_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute calendar management task"""
+    _start_unless_cancelled(self)
+    
     try:
         from app.services.tasks.calendar_automation import CalendarAutomation
         
-        self.update_state(state="PROCESSING", meta={"progress": 0})
-        
         calendar_service = CalendarAutomation()
         
         action = task_data.get("action")
@@ -336,6 +496,51 @@ class TaskQueue:
         result = execute_file_task.apply_async(args=[task_data], task_id=task_id)
         return result.id
     
+    async def submit_file_tasks(
+        self,
+        ops: List[Tuple[str, Dict[str, Any]]],
+        user_id: Optional[str] = None
+    ) -> List[str]:
+        """Submit a burst of file operation tasks as one group publish"""
+        
+        if not ops:
+            return []
+        
+        task_ids = [str(uuid.uuid4()) for _ in ops]
+        
+        signatures = [
+            execute_file_task.s({
+                "operation": operation,
+                "parameters": parameters,
+                "user_id": user_id
+            }).set(task_id=task_id)
+            for task_id, (operation, parameters) in zip(task_ids, ops)
+        ]
+        
+        # One producer/connection for the whole burst instead of one per task
+        group(signatures).apply_async()
+        return task_ids
+    
+    async def submit_file_batch_task(
+        self,
+        ops: List[Tuple[str, Dict[str, Any]]],
+        user_id: Optional[str] = None
+    ) -> str:
+        """Submit several file operations to run together in a single task"""
+        
+        task_id = str(uuid.uuid4())
+        
+        task_data = {
+            "ops": [
+                {"operation": operation, "parameters": parameters}
+                for operation, parameters in ops
+            ],
+            "user_id": user_id
+        }
+        
+        result = execute_file_batch_task.apply_async(args=[task_data], task_id=task_id)
+        return result.id
+    
     async def submit_app_control_task(
         self,
         action: str,
@@ -387,8 +592,20 @@ class TaskQueue:
         }
     
     def cancel_task(self, task_id: str) -> bool:
-        """Cancel a task"""
-        self.celery.control.revoke(task_id, terminate=True)
+        """Cancel a task
+        
+        Queued tasks see a Redis flag when they start and stop there; only a
+        task that already reports PROCESSING needs the broadcast revoke.
+        """
+        try:
+            _get_redis().set(_CANCEL_KEY_PREFIX + task_id, "1", ex=_CANCEL_FLAG_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Could not set cancellation flag, revoking instead: {e}")
+            self.celery.control.revoke(task_id, terminate=True)
+            return True
+        
+        if AsyncResult(task_id, app=self.celery).state in ("STARTED", "PROCESSING"):
+            self.celery.control.revoke(task_id, terminate=True)
         return True
 
 
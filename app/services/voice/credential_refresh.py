@@ -0,0 +1,82 @@
+"""
+Background refresh of Google Cloud credentials for the voice clients
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+# Google auth imports with fallback
+try:
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+    GOOGLE_AUTH_AVAILABLE = True
+except ImportError:
+    GoogleAuthRequest = None
+    GOOGLE_AUTH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Refresh this long before the token expires, so no request pays for it inline
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# Bounds on the sleep between checks, and the back-off after a failed refresh
+MIN_REFRESH_INTERVAL = 30.0
+MAX_REFRESH_INTERVAL = 3600.0
+RETRY_INTERVAL = 60.0
+
+
+def _seconds_until_refresh(credentials: Any) -> Optional[float]:
+    """Seconds until the credentials enter the refresh window (<= 0 means now)
+    
+    None means no token has been fetched yet, or the token never expires.
+    """
+    expiry = getattr(credentials, 'expiry', None)
+    if expiry is None:
+        return None
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (expiry - REFRESH_MARGIN - now).total_seconds()
+
+
+def _refresh_loop(credentials: Any, name: str):
+    """Keep the credentials' token fresh for the life of the process"""
+    request = GoogleAuthRequest()
+    while True:
+        try:
+            remaining = _seconds_until_refresh(credentials)
+            if remaining is None or remaining <= 0:
+                credentials.refresh(request)
+                logger.debug(f"Refreshed {name} credentials ahead of expiry")
+                remaining = _seconds_until_refresh(credentials)
+            wait = MAX_REFRESH_INTERVAL if remaining is None else remaining
+        except Exception as e:
+            logger.warning(f"Background refresh of {name} credentials failed: {e}")
+            wait = RETRY_INTERVAL
+        
+        time.sleep(min(max(wait, MIN_REFRESH_INTERVAL), MAX_REFRESH_INTERVAL))
+
+
+def start_credential_refresher(client: Any, name: str) -> bool:
+    """Refresh a Google Cloud client's credentials in a daemon thread
+    
+    Returns False when the client's credentials cannot be reached or
+    google-auth's requests transport is not installed.
+    """
+    if not GOOGLE_AUTH_AVAILABLE:
+        return False
+    
+    transport = getattr(client, '_transport', None)
+    credentials = getattr(transport, '_credentials', None)
+    if credentials is None or not hasattr(credentials, 'refresh'):
+        return False
+    
+    thread = threading.Thread(
+        target=_refresh_loop,
+        args=(credentials, name),
+        name=f"{name}-credential-refresh",
+        daemon=True
+    )
+    thread.start()
+    return True
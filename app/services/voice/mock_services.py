@@ -5,28 +5,41 @@ Mock voice services for development without Google Cloud credentials
 import asyncio
 import base64
 import logging
-from typing import List, Optional
+from typing import List, Optional, AsyncIterator, Iterable, Union
 
 from app.models.schemas.voice import STTResponse, TTSResponse
 
 logger = logging.getLogger(__name__)
 
+# Base64 of 1KB of silence, encoded once rather than per call
+_MOCK_AUDIO_B64 = base64.b64encode(b"\x00" * 1024).decode('ascii')
+
 
 class MockSTTService:
     """Mock Speech-to-Text service for development"""
     
-    def __init__(self):
-        """Initialize mock STT service"""
+    def __init__(self, simulated_latency_s: float = 0.0):
+        """Initialize mock STT service
+        
+        simulated_latency_s adds an artificial delay to each call; it is
+        zero by default so tests and mock-mode requests don't pay for it.
+        """
         self.mock_mode = True
+        self.simulated_latency_s = simulated_latency_s
         logger.info("Mock STT service initialized")
     
+    async def _simulate_latency(self):
+        """Sleep for the configured latency; the sleep yields, so concurrent calls overlap"""
+        if self.simulated_latency_s > 0:
+            await asyncio.sleep(self.simulated_latency_s)
+    
     async def transcribe_audio(self, 
                                audio_data: str, 
                                sample_rate: int = 16000,
                                encoding: str = "LINEAR16",
                                language_code: Optional[str] = None) -> STTResponse:
         """Mock transcribe audio data to text"""
-        await asyncio.sleep(0.1)  # Simulate processing time
+        await self._simulate_latency()
         
         return STTResponse(
             transcript="Mock transcription: This is a simulated response for development.",
@@ -34,13 +47,11 @@ class MockSTTService:
             language_detected=language_code or "en-US"
         )
     
-    async def transcribe_streaming(self, audio_chunks: List[bytes]) -> List[str]:
+    async def transcribe_streaming(self, audio_chunks: Union[Iterable[bytes], AsyncIterator[bytes]]) -> AsyncIterator[str]:
         """Mock transcribe streaming audio chunks"""
-        await asyncio.sleep(0.1)
-        return [
-            "Mock streaming chunk 1: Hello world",
-            "Mock streaming chunk 2: This is a test"
-        ]
+        await self._simulate_latency()
+        yield "Mock streaming chunk 1: Hello world"
+        yield "Mock streaming chunk 2: This is a test"
     
     def get_supported_languages(self) -> List[str]:
         """Get mock list of supported languages"""
@@ -54,11 +65,21 @@ class MockSTTService:
 class MockTTSService:
     """Mock Text-to-Speech service for development"""
     
-    def __init__(self):
-        """Initialize mock TTS service"""
+    def __init__(self, simulated_latency_s: float = 0.0):
+        """Initialize mock TTS service
+        
+        simulated_latency_s adds an artificial delay to each call; it is
+        zero by default so tests and mock-mode requests don't pay for it.
+        """
         self.mock_mode = True
+        self.simulated_latency_s = simulated_latency_s
         logger.info("Mock TTS service initialized")
     
+    async def _simulate_latency(self):
+        """Sleep for the configured latency; the sleep yields, so concurrent calls overlap"""
+        if self.simulated_latency_s > 0:
+            await asyncio.sleep(self.simulated_latency_s)
+    
     async def synthesize_speech(self,
                                 text: str,
                                 voice_name: Optional[str] = None,
@@ -66,11 +87,10 @@ class MockTTSService:
                                 pitch: Optional[float] = None,
                                 audio_format: Optional[str] = None) -> str:
         """Mock synthesize speech from text"""
-        await asyncio.sleep(0.1)  # Simulate processing time
+        await self._simulate_latency()
         
-        # Create a simple mock audio data (base64 encoded silence)
-        mock_audio = b"\x00" * 1024  # 1KB of silence
-        return base64.b64encode(mock_audio).decode('utf-8')
+        # Simple mock audio data (base64 encoded silence)
+        return _MOCK_AUDIO_B64
     
     async def get_voices(self, language_code: str = "en-US") -> List[dict]:
         """Mock get available voices"""
@@ -0,0 +1,119 @@
+"""
+Retry and circuit-breaker helpers for Google Cloud voice calls
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Google API error imports with fallback
+try:
+    from google.api_core.exceptions import (
+        DeadlineExceeded, InternalServerError, ServiceUnavailable
+    )
+    TRANSIENT_ERRORS: tuple = (DeadlineExceeded, ServiceUnavailable)
+    # Errors that say the backend itself is unhealthy; only these trip the breaker
+    SERVER_ERRORS: tuple = TRANSIENT_ERRORS + (InternalServerError,)
+except ImportError:
+    TRANSIENT_ERRORS = ()
+    SERVER_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+# Blocking Google voice RPCs get their own threads rather than queueing in the
+# loop's default executor behind Gemini, file and other blocking calls
+voice_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="google-voice")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Stop calling a failing backend for a while after repeated failures
+    
+    After fail_max consecutive failures the circuit opens and calls fail fast
+    with CircuitOpenError. Once reset_timeout seconds pass, one trial call is
+    let through: success closes the circuit, failure re-opens it.
+    """
+    
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self._failures < self.fail_max:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self._trial_in_flight = True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+    
+    def release_trial(self):
+        """Forget an unfinished trial call (e.g. cancelled) without judging it"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.fail_max:
+                if self._failures == self.fail_max:
+                    logger.warning(f"{self.name} circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+async def call_with_retry(breaker: CircuitBreaker, func: Callable[[], Any],
+                          attempts: int = 2, initial_wait: float = 0.05,
+                          max_wait: float = 0.5) -> Any:
+    """Run a blocking call in the executor behind a circuit breaker
+    
+    Transient Google errors (deadline exceeded, unavailable) are retried with
+    jittered exponential backoff; anything else is raised at once. Only
+    server-side errors count towards opening the circuit, so bad requests
+    (e.g. InvalidArgument for malformed audio) cannot lock out other users.
+    """
+    loop = asyncio.get_event_loop()
+    wait = initial_wait
+    
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = await loop.run_in_executor(voice_executor, func)
+        except TRANSIENT_ERRORS as e:
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            logger.info(f"{breaker.name} call failed transiently ({e}), retrying")
+            await asyncio.sleep(random.uniform(0, wait))
+            wait = min(wait * 2, max_wait)
+            continue
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+        except SERVER_ERRORS:
+            breaker.record_failure()
+            raise
+        except Exception:
+            breaker.release_trial()
+            raise
+        
+        breaker.record_success()
+        return result
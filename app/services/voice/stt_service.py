@@ -3,10 +3,18 @@ Speech-to-Text service using Google Cloud STT API with fallback support
 """
 
 import asyncio
-import base64
+import functools
 import logging
 import os
-from typing import List, Optional, Any, Dict, Callable
+import queue
+import threading
+from typing import List, Optional, Any, Dict, Callable, Union, AsyncIterator, Iterable
+
+try:
+    # SIMD base64 (AVX2/NEON) when available
+    from pybase64 import b64decode as _b64decode
+except ImportError:
+    from base64 import b64decode as _b64decode
 
 # Google Cloud imports with fallback
 try:
@@ -20,10 +28,57 @@ except ImportError:
 
 from app.core.config import settings
 from app.core.exceptions import VoiceProcessingError
+from app.services.voice.credential_refresh import start_credential_refresher
+from app.services.voice.resilience import CircuitBreaker, call_with_retry, voice_executor
 from app.models.schemas.voice import STTRequest, STTResponse
 
 logger = logging.getLogger(__name__)
 
+# One SpeechClient per process: each one opens gRPC channels and loads
+# credentials, and the sync client is safe to share across threads and loops
+_client_lock = threading.Lock()
+_shared_client: Optional[Any] = None
+
+
+# Shared like the client: once Google STT keeps failing, requests go straight
+# to the mock fallback instead of each waiting out a timeout
+_breaker = CircuitBreaker("stt")
+
+
+# Mock transcripts for short / medium / long audio, and the base64 lengths
+# (roughly 1000 characters per second) where each bucket starts
+_MOCK_TRANSCRIPTS = (
+    "Hello",
+    "Hello, this is a mock transcription.",
+    "Hello, this is a mock transcription of a longer audio file.",
+)
+_MOCK_MEDIUM_LENGTH = 3 * 1000
+_MOCK_LONG_LENGTH = 10 * 1000
+
+# Marks the end of a streaming recognition session on the results queue
+_STREAM_DONE = object()
+
+
+async def _iterate_chunks(audio_chunks: Union[Iterable[bytes], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+    """Iterate audio chunks from either a plain list or an async source"""
+    if hasattr(audio_chunks, '__aiter__'):
+        async for chunk in audio_chunks:
+            yield chunk
+    else:
+        for chunk in audio_chunks:
+            yield chunk
+
+
+def _get_shared_client():
+    """Return the process-wide SpeechClient, creating it on first use"""
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            _shared_client = gcloud_speech.SpeechClient()
+            # Keep token refreshes off the request path
+            start_credential_refresher(_shared_client, "stt")
+        return _shared_client
+
 
 class STTService:
     """Speech-to-Text service with fallback support"""
@@ -37,9 +92,11 @@ class STTService:
         if not GOOGLE_STT_AVAILABLE:
             logger.warning("Google Cloud STT library not available. Running in mock mode.")
             self._mock_mode = True
-            return
-            
-        self._initialize_google_client()
+        else:
+            self._initialize_google_client()
+        
+        # None of these change after init, so the per-call mock check is one flag
+        self._use_mock = self._mock_mode or not self._initialized or self.client is None or gcloud_speech is None
     
     def _initialize_google_client(self):
         """Initialize Google Cloud STT client"""
@@ -53,7 +110,7 @@ class STTService:
             
             # Initialize client
             if gcloud_speech is not None:
-                self.client = gcloud_speech.SpeechClient()
+                self.client = _get_shared_client()
                 self._initialized = True
                 logger.info("Google Cloud STT service initialized successfully")
             else:
@@ -66,10 +123,17 @@ class STTService:
             logger.warning(f"Failed to initialize Google Cloud STT client: {e}. Running in mock mode.")
             self._mock_mode = True
     
-    async def transcribe_audio(self, audio_data: str, sample_rate: int = 16000, 
+    async def transcribe_audio(self, audio_data: Union[str, bytes], sample_rate: int = 16000, 
                              encoding: str = "LINEAR16", language_code: Optional[str] = None) -> STTResponse:
-        """Transcribe audio data to text (endpoint-compatible method)"""
-        if self._mock_mode or not self._initialized or self.client is None:
+        """Transcribe audio data to text (endpoint-compatible method)
+        
+        audio_data is base64 text from JSON clients, or raw bytes from
+        uploads, which then skip the base64 round-trip entirely.
+        """
+        if isinstance(audio_data, (bytes, bytearray)):
+            return await self._transcribe_raw(bytes(audio_data), sample_rate, language_code)
+        
+        if self._use_mock:
             return self._create_mock_response(STTRequest(
                 audio_data=audio_data,
                 sample_rate=sample_rate,
@@ -99,89 +163,96 @@ class STTService:
                 language_code=language_code
             ))
     
-    def _create_mock_transcript(self, audio_data: str) -> str:
+    async def _transcribe_raw(self, audio_data: bytes, sample_rate: int,
+                              language_code: Optional[str]) -> STTResponse:
+        """Transcribe raw audio bytes"""
+        if self._use_mock:
+            return self._mock_response_for(audio_data)
+            
+        try:
+            return await self._recognize(audio_data, sample_rate, language_code)
+        except Exception as e:
+            logger.error(f"STT transcription failed: {e}. Falling back to mock response.")
+            return self._mock_response_for(audio_data)
+    
+    def _create_mock_transcript(self, audio_data: Union[str, bytes]) -> str:
         """Create a mock transcript when STT is not available"""
-        # Return a simple mock transcript based on audio data length
-        audio_length = len(audio_data) // 1000  # Rough estimate of seconds
-        if audio_length < 3:
-            return "Hello"
-        elif audio_length < 10:
-            return "Hello, this is a mock transcription."
-        else:
-            return "Hello, this is a mock transcription of a longer audio file."
+        # Return a simple mock transcript based on audio data length, measured
+        # as base64 text so raw and encoded audio get the same answer
+        encoded_length = len(audio_data) if isinstance(audio_data, str) else 4 * ((len(audio_data) + 2) // 3)
+        # Comparing lengths directly gives the same buckets as whole seconds
+        bucket = (encoded_length >= _MOCK_MEDIUM_LENGTH) + (encoded_length >= _MOCK_LONG_LENGTH)
+        return _MOCK_TRANSCRIPTS[bucket]
     
     async def transcribe_audio_full(self, request: STTRequest) -> STTResponse:
         """Transcribe audio data to text with full response"""
-        if self._mock_mode or not self._initialized or self.client is None or gcloud_speech is None:
+        if self._use_mock:
             return self._create_mock_response(request)
             
         try:
             # Decode base64 audio data
-            audio_data = base64.b64decode(request.audio_data)
-            
-            # Create recognition config with custom settings
-            config = gcloud_speech.RecognitionConfig(
-                encoding=gcloud_speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=request.sample_rate,
-                language_code=request.language_code or settings.STT_LANGUAGE_CODE,
-                enable_automatic_punctuation=True,
-                alternative_language_codes=["en-GB", "en-CA", "en-AU"],
-            )
-            
-            # Create audio object
-            audio = gcloud_speech.RecognitionAudio(content=audio_data)
-            
-            # Create type-safe client reference
-            client = self.client
-            assert client is not None, "Client should not be None here"
-            
-            # Workaround: Use a synchronous approach to avoid executor typing issues
-            # We'll create a future and set its result directly
-            loop = asyncio.get_event_loop()
-            future = loop.create_future()
-            
-            # Use try/except to handle any errors during synchronous operation
-            try:
-                # Perform the synchronous operation
-                result = client.recognize(config=config, audio=audio)
-                # Set the result of the future
-                future.set_result(result)
-            except Exception as e:
-                # Set exception if there was an error
-                future.set_exception(e)
-                
-            # Wait for the future
-            response = await future
-            
-            if not response.results:
-                return STTResponse(
-                    transcript="",
-                    confidence=0.0,
-                    alternatives=[]
-                )
-            
-            # Get primary result
-            result = response.results[0]
-            alternative = result.alternatives[0]
-            
-            # Extract alternatives
-            alternatives = [
-                alt.transcript for alt in result.alternatives[1:5]  # Up to 4 alternatives
-            ]
+            audio_data = _b64decode(request.audio_data)
             
-            return STTResponse(
-                transcript=alternative.transcript,
-                confidence=alternative.confidence,
-                alternatives=alternatives
-            )
+            return await self._recognize(audio_data, request.sample_rate, request.language_code)
             
         except Exception as e:
             logger.error(f"STT transcription failed: {e}")
             return self._create_mock_response(request)
     
+    async def _recognize(self, audio_data: bytes, sample_rate: int,
+                         language_code: Optional[str]) -> STTResponse:
+        """Run Google Cloud recognition on raw audio bytes"""
+        # Create recognition config with custom settings
+        config = gcloud_speech.RecognitionConfig(
+            encoding=gcloud_speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+            language_code=language_code or settings.STT_LANGUAGE_CODE,
+            enable_automatic_punctuation=True,
+            alternative_language_codes=["en-GB", "en-CA", "en-AU"],
+        )
+        
+        # Create audio object
+        audio = gcloud_speech.RecognitionAudio(content=audio_data)
+        
+        # Create type-safe client reference
+        client = self.client
+        assert client is not None, "Client should not be None here"
+        
+        # Run the blocking recognize call in the executor so the event
+        # loop keeps serving other requests during the round-trip
+        response = await call_with_retry(
+            _breaker, functools.partial(client.recognize, config=config, audio=audio)
+        )
+        
+        if not response.results:
+            return STTResponse(
+                transcript="",
+                confidence=0.0,
+                alternatives=[]
+            )
+        
+        # Get primary result
+        result = response.results[0]
+        alternative = result.alternatives[0]
+        
+        # Extract alternatives
+        alternatives = [
+            alt.transcript for alt in result.alternatives[1:5]  # Up to 4 alternatives
+        ]
+        
+        return STTResponse(
+            transcript=alternative.transcript,
+            confidence=alternative.confidence,
+            alternatives=alternatives
+        )
+    
     def _create_mock_response(self, request: STTRequest) -> STTResponse:
         """Create a mock STT response when service is not available"""
-        transcript = self._create_mock_transcript(request.audio_data)
+        return self._mock_response_for(request.audio_data)
+    
+    def _mock_response_for(self, audio_data: Union[str, bytes]) -> STTResponse:
+        """Mock STT response for base64 or raw audio"""
+        transcript = self._create_mock_transcript(audio_data)
         
         return STTResponse(
             transcript=transcript,
@@ -192,19 +263,99 @@ class STTService:
             ]
         )
     
-    async def transcribe_streaming(self, audio_chunks: List[bytes]) -> List[str]:
-        """Transcribe streaming audio chunks with fallback"""
-        if self._mock_mode or not self._initialized or self.client is None or gcloud_speech is None:
-            return ["Mock streaming transcription"]
-            
+    async def transcribe_streaming(self, audio_chunks: Union[Iterable[bytes], AsyncIterator[bytes]],
+                                   sample_rate: int = 16000,
+                                   language_code: Optional[str] = None) -> AsyncIterator[str]:
+        """Transcribe streaming audio chunks with fallback
+        
+        Chunks may come from an async source and are sent to Google as they
+        arrive; each final transcript segment is yielded as soon as it is
+        recognized.
+        """
+        if self._use_mock:
+            yield "Mock streaming transcription"
+            return
+        
+        yielded = False
         try:
-            # Mock implementation due to complex typing/functionality issues
-            # This can be implemented fully in a real-world scenario
-            return ["Streaming transcription is currently in mock mode"]
-            
+            async for transcript in self._stream_with_google(audio_chunks, sample_rate, language_code):
+                yielded = True
+                yield transcript
+                
         except Exception as e:
+            # Once real segments have gone out, a truncated transcript must
+            # not pass for a complete one
+            if yielded:
+                raise
             logger.error(f"Streaming STT failed: {e}")
-            return ["Mock streaming transcription"]
+            yield "Mock streaming transcription"
+    
+    async def _stream_with_google(self, audio_chunks: Union[Iterable[bytes], AsyncIterator[bytes]],
+                                  sample_rate: int, language_code: Optional[str]) -> AsyncIterator[str]:
+        """Bridge async audio chunks to the sync streaming_recognize call"""
+        streaming_config = gcloud_speech.StreamingRecognitionConfig(
+            config=gcloud_speech.RecognitionConfig(
+                encoding=gcloud_speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=sample_rate,
+                language_code=language_code or settings.STT_LANGUAGE_CODE,
+                enable_automatic_punctuation=True,
+            ),
+            interim_results=False,
+        )
+        
+        client = self.client
+        assert client is not None, "Client should not be None here"
+        
+        loop = asyncio.get_event_loop()
+        audio_queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        
+        def requests():
+            while True:
+                chunk = audio_queue.get()
+                if chunk is None:
+                    return
+                yield gcloud_speech.StreamingRecognizeRequest(audio_content=chunk)
+        
+        def recognize():
+            # Runs on a voice thread; hands results back to the loop
+            try:
+                for response in client.streaming_recognize(config=streaming_config, requests=requests()):
+                    for result in response.results:
+                        if result.is_final and result.alternatives:
+                            loop.call_soon_threadsafe(results.put_nowait, result.alternatives[0].transcript)
+            except Exception as e:
+                loop.call_soon_threadsafe(results.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(results.put_nowait, _STREAM_DONE)
+        
+        async def feed():
+            try:
+                async for chunk in _iterate_chunks(audio_chunks):
+                    audio_queue.put(chunk)
+            finally:
+                audio_queue.put(None)
+        
+        loop.run_in_executor(voice_executor, recognize)
+        feeder = asyncio.create_task(feed())
+        
+        try:
+            while True:
+                item = await results.get()
+                if item is _STREAM_DONE:
+                    # The feeder ends the request stream even when the audio
+                    # source fails, so surface its error rather than treating
+                    # the truncated audio as the whole utterance
+                    if feeder.done() and not feeder.cancelled() and feeder.exception():
+                        raise feeder.exception()
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Unblock the request generator if the consumer stopped early
+            feeder.cancel()
+            audio_queue.put(None)
     
     def get_supported_languages(self) -> List[str]:
         """Get list of supported languages"""
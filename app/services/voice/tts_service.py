@@ -3,11 +3,21 @@ Text-to-Speech service using Google Cloud TTS API with fallback support
 """
 
 import asyncio
-import base64
 import functools
+import hashlib
 import logging
 import os
-from typing import List, Dict, Any, Optional, Union
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Union, AsyncIterator
+
+try:
+    # SIMD base64 (AVX2/NEON) when available
+    from pybase64 import b64decode as _b64decode, b64encode as _b64encode
+except ImportError:
+    from base64 import b64decode as _b64decode, b64encode as _b64encode
 
 # Google Cloud imports with fallback
 try:
@@ -21,10 +31,108 @@ except ImportError:
 
 from app.core.config import settings
 from app.core.exceptions import VoiceProcessingError
+from app.services.voice.credential_refresh import start_credential_refresher
+from app.services.voice.resilience import CircuitBreaker, call_with_retry, voice_executor
 from app.models.schemas.voice import TTSRequest, TTSResponse
 
 logger = logging.getLogger(__name__)
 
+# Output format -> content type / Google encoding, built once at import
+_CONTENT_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+}
+_GOOGLE_AUDIO_ENCODINGS = {
+    "mp3": gcloud_tts.AudioEncoding.MP3,
+    "wav": gcloud_tts.AudioEncoding.LINEAR16,
+    "ogg": gcloud_tts.AudioEncoding.OGG_OPUS,
+} if gcloud_tts is not None else {}
+_DEFAULT_GOOGLE_AUDIO_ENCODING = gcloud_tts.AudioEncoding.MP3 if gcloud_tts is not None else None
+
+# Estimated speaking time per ASCII byte, in centiseconds: letters take about
+# 7cs, digits (read out as words) more, whitespace little, and punctuation
+# stands for the pause it causes
+_LETTER_CS = 7
+
+
+def _build_duration_table() -> bytes:
+    table = bytearray(256)
+    for c in range(128):
+        ch = chr(c)
+        if ch.isalpha():
+            table[c] = _LETTER_CS
+        elif ch.isdigit():
+            table[c] = 15
+        elif ch in ".!?":
+            table[c] = 30
+        elif ch in ",;:":
+            table[c] = 15
+        elif ch.isspace():
+            table[c] = 3
+        else:
+            table[c] = 2
+    return bytes(table)
+
+
+_DURATION_TABLE = _build_duration_table()
+
+
+def _estimate_duration(text: str) -> float:
+    """Rough spoken duration of text in seconds"""
+    ascii_text = text.encode('ascii', 'ignore')
+    # translate() maps each byte to its weight in C; sum() then adds the bytes
+    centiseconds = sum(ascii_text.translate(_DURATION_TABLE))
+    # Non-ASCII characters (accented or non-Latin letters) count as letters
+    centiseconds += (len(text) - len(ascii_text)) * _LETTER_CS
+    return centiseconds / 100
+
+
+# Any SSML tag (<speak>, <break/>, <prosody ...>, ...), stripped in one pass
+_SSML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Formats Google's streaming synthesis can produce as a self-describing stream
+# (its PCM output has no WAV header, and MP3 is not offered)
+_STREAMING_FORMATS = {"ogg"}
+
+# Chunk size when a one-shot synthesis is handed out as a stream
+_AUDIO_CHUNK_BYTES = 32 * 1024
+
+# Base64 of the 1KB of silence returned in mock mode, encoded once
+_MOCK_AUDIO_B64 = _b64encode(b'\x00' * 1024).decode('ascii')
+
+# One TextToSpeechClient per process: each one opens gRPC channels and loads
+# credentials, and the sync client is safe to share across threads and loops
+_client_lock = threading.Lock()
+_shared_client: Optional[Any] = None
+
+
+# Synthesized audio for recently spoken phrases, shared by every TTSService in
+# the process; long texts are rarely repeated verbatim and are not cached
+_SPEECH_CACHE_MAX_ENTRIES = 512
+_SPEECH_CACHE_MAX_TEXT = 500
+_speech_cache: "OrderedDict[bytes, TTSResponse]" = OrderedDict()
+_speech_cache_lock = threading.Lock()
+
+# The voice catalog changes every few months, not per request
+_VOICES_CACHE_TTL = 24 * 3600
+
+
+# Shared like the client: once Google TTS keeps failing, requests go straight
+# to the mock fallback instead of each waiting out a timeout
+_breaker = CircuitBreaker("tts")
+
+
+def _get_shared_client():
+    """Return the process-wide TextToSpeechClient, creating it on first use"""
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            _shared_client = gcloud_tts.TextToSpeechClient()
+            # Keep token refreshes off the request path
+            start_credential_refresher(_shared_client, "tts")
+        return _shared_client
+
 
 class TTSService:
     """Text-to-Speech service with Google Cloud TTS and fallback support"""
@@ -35,12 +143,23 @@ class TTSService:
         self._initialized = False
         self._mock_mode = False
         
+        # Cached voice catalog; the lock makes concurrent misses share one fetch
+        self._voices_cache: Optional[List[Dict[str, Any]]] = None
+        self._voices_cache_expiry = 0.0
+        self._voices_lock = asyncio.Lock()
+        
+        # Syntheses in progress by request key, so identical concurrent
+        # requests share one Google call
+        self._inflight: Dict[bytes, "asyncio.Task[TTSResponse]"] = {}
+        
         if not GOOGLE_TTS_AVAILABLE:
             logger.warning("Google Cloud TTS library not available. Running in mock mode.")
             self._mock_mode = True
-            return
-            
-        self._initialize_google_client()
+        else:
+            self._initialize_google_client()
+        
+        # None of these change after init, so the per-call mock check is one flag
+        self._use_mock = self._mock_mode or not self._initialized or self.client is None or gcloud_tts is None
     
     def _initialize_google_client(self):
         """Initialize Google Cloud TTS client"""
@@ -54,7 +173,7 @@ class TTSService:
             
             # Initialize client
             if gcloud_tts is not None:
-                self.client = gcloud_tts.TextToSpeechClient()
+                self.client = _get_shared_client()
                 self._initialized = True
                 logger.info("Google Cloud TTS service initialized successfully")
             else:
@@ -69,14 +188,59 @@ class TTSService:
     
     async def synthesize_speech(self, request: TTSRequest) -> TTSResponse:
         """Synthesize text to speech with automatic fallback"""
-        if self._mock_mode or not self._initialized or self.client is None:
+        if self._use_mock:
             return self._create_mock_response(request)
             
+        key = self._speech_key(request)
+        cacheable = len(request.text) <= _SPEECH_CACHE_MAX_TEXT
+        if cacheable:
+            with _speech_cache_lock:
+                cached = _speech_cache.get(key)
+                if cached is not None:
+                    _speech_cache.move_to_end(key)
+                    return cached
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._synthesize_and_cache(request, key, cacheable))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget_inflight, key))
+        
+        # Shielded so one caller going away doesn't cancel the shared synthesis
+        return await asyncio.shield(task)
+    
+    def _forget_inflight(self, key: bytes, task: "asyncio.Task[TTSResponse]"):
+        """Drop a finished synthesis from the in-flight registry"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+    
+    async def _synthesize_and_cache(self, request: TTSRequest, key: bytes, cacheable: bool) -> TTSResponse:
+        """Run one Google synthesis, caching it on success"""
         try:
-            return await self._synthesize_with_google(request)
+            response = await self._synthesize_with_google(request)
         except Exception as e:
             logger.error(f"TTS synthesis failed: {e}. Falling back to mock response.")
             return self._create_mock_response(request)
+        
+        if cacheable:
+            with _speech_cache_lock:
+                _speech_cache[key] = response
+                if len(_speech_cache) > _SPEECH_CACHE_MAX_ENTRIES:
+                    _speech_cache.popitem(last=False)
+        
+        return response
+    
+    def _speech_key(self, request: TTSRequest) -> bytes:
+        """Key over the effective synthesis settings"""
+        canonical = "|".join((
+            request.text,
+            request.voice_name or settings.TTS_VOICE_NAME,
+            repr(request.speaking_rate or settings.TTS_SPEAKING_RATE),
+            repr(request.pitch or settings.TTS_PITCH),
+            repr(request.volume_gain_db or 0.0),
+            request.output_format.lower(),
+        ))
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()
     
     async def _synthesize_with_google(self, request: TTSRequest) -> TTSResponse:
         """Synthesize using Google Cloud TTS"""
@@ -114,37 +278,112 @@ class TTSService:
                 audio_config=audio_config
             )
         
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, synthesize_call)  # type: ignore[arg-type]
+        response = await call_with_retry(_breaker, synthesize_call)
         
         # Encode audio data
-        audio_data = base64.b64encode(response.audio_content).decode('utf-8')
+        audio_data = _b64encode(response.audio_content).decode('ascii')
         
         # Calculate approximate duration
-        duration = len(request.text) * 0.1  # ~100ms per character
+        duration = _estimate_duration(request.text)
         
         return TTSResponse(
             audio_data=audio_data,
-            content_type=self._get_content_type(request.output_format),
+            content_type=self.get_content_type(request.output_format),
             duration_seconds=duration
         )
     
+    async def synthesize_speech_stream(self, request: TTSRequest) -> AsyncIterator[bytes]:
+        """Synthesize text to speech, yielding raw audio as it becomes available
+        
+        Uses Google's streaming synthesis where the voice and format allow it,
+        so playback can start on the first chunk; otherwise the one-shot
+        result is yielded in chunks.
+        """
+        if not self._use_mock and self._supports_streaming(request):
+            yielded = False
+            try:
+                async for chunk in self._stream_with_google(request):
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Part of the clip has already gone out; appending a whole
+                # fresh one after it would corrupt the stream
+                if yielded:
+                    raise
+                logger.error(f"Streaming TTS failed: {e}. Falling back to one-shot synthesis.")
+        
+        response = await self.synthesize_speech(request)
+        audio = _b64decode(response.audio_data)
+        for start in range(0, len(audio), _AUDIO_CHUNK_BYTES):
+            yield audio[start:start + _AUDIO_CHUNK_BYTES]
+    
+    def _supports_streaming(self, request: TTSRequest) -> bool:
+        """Whether Google streaming synthesis applies to this request"""
+        voice_name = request.voice_name or settings.TTS_VOICE_NAME
+        return (
+            hasattr(self.client, 'streaming_synthesize')
+            and request.output_format.lower() in _STREAMING_FORMATS
+            and "Chirp3-HD" in (voice_name or "")  # only these voices stream
+        )
+    
+    async def _stream_with_google(self, request: TTSRequest) -> AsyncIterator[bytes]:
+        """Stream synthesis chunks from Google Cloud TTS"""
+        voice_name = request.voice_name or settings.TTS_VOICE_NAME
+        
+        config_request = gcloud_tts.StreamingSynthesizeRequest(
+            streaming_config=gcloud_tts.StreamingSynthesizeConfig(
+                voice=gcloud_tts.VoiceSelectionParams(
+                    language_code=self._extract_language_code(voice_name),
+                    name=voice_name,
+                ),
+                streaming_audio_config=gcloud_tts.StreamingAudioConfig(
+                    audio_encoding=gcloud_tts.AudioEncoding.OGG_OPUS,
+                ),
+            )
+        )
+        text_request = gcloud_tts.StreamingSynthesizeRequest(
+            input=gcloud_tts.StreamingSynthesisInput(text=request.text)
+        )
+        
+        client = self.client
+        assert client is not None, "Client should not be None here"
+        
+        loop = asyncio.get_event_loop()
+        responses = await loop.run_in_executor(
+            voice_executor, client.streaming_synthesize, iter([config_request, text_request])
+        )
+        
+        def _get_next():
+            try:
+                return next(responses), False
+            except StopIteration:
+                return None, True
+        
+        while True:
+            response, done = await loop.run_in_executor(voice_executor, _get_next)
+            if done:
+                break
+            if response.audio_content:
+                yield response.audio_content
+    
+    def is_fallback(self, response: TTSResponse) -> bool:
+        """Whether a response is the mock silence returned instead of real speech"""
+        return response.audio_data == _MOCK_AUDIO_B64
+    
     def _create_mock_response(self, request: TTSRequest) -> TTSResponse:
         """Create a mock response when TTS is not available"""
-        # Create minimal audio data
-        mock_audio = b'\x00' * 1024  # 1KB of silence
-        audio_data = base64.b64encode(mock_audio).decode('utf-8')
-        
+        # Create minimal audio data (1KB of silence)
         return TTSResponse(
-            audio_data=audio_data,
-            content_type=self._get_content_type(request.output_format),
-            duration_seconds=len(request.text) * 0.1
+            audio_data=_MOCK_AUDIO_B64,
+            content_type=self.get_content_type(request.output_format),
+            duration_seconds=_estimate_duration(request.text)
         )
     
     async def synthesize_ssml(self, ssml: str, voice_name: Optional[str] = None, 
                             output_format: str = "mp3") -> TTSResponse:
         """Synthesize SSML to speech with fallback"""
-        if self._mock_mode or not self._initialized or self.client is None:
+        if self._use_mock:
             return self._create_mock_ssml_response(ssml, output_format)
             
         try:
@@ -187,58 +426,64 @@ class TTSService:
             )
         
         loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, synthesize_ssml_call)  # type: ignore[arg-type]
+        response = await loop.run_in_executor(voice_executor, synthesize_ssml_call)  # type: ignore[arg-type]
         
         # Encode audio data
-        audio_data = base64.b64encode(response.audio_content).decode('utf-8')
+        audio_data = _b64encode(response.audio_content).decode('ascii')
         
         return TTSResponse(
             audio_data=audio_data,
-            content_type=self._get_content_type(output_format),
+            content_type=self.get_content_type(output_format),
             duration_seconds=0.0  # Cannot estimate from SSML
         )
     
     def _create_mock_ssml_response(self, ssml: str, output_format: str) -> TTSResponse:
         """Create mock response for SSML synthesis"""
         # Extract text from SSML for duration calculation
-        text = ssml.replace('<speak>', '').replace('</speak>', '')
+        text = _SSML_TAG_RE.sub('', ssml)
         
         # Create minimal audio data
-        mock_audio = b'\x00' * 1024
-        audio_data = base64.b64encode(mock_audio).decode('utf-8')
-        
         return TTSResponse(
-            audio_data=audio_data,
-            content_type=self._get_content_type(output_format),
-            duration_seconds=len(text) * 0.1
+            audio_data=_MOCK_AUDIO_B64,
+            content_type=self.get_content_type(output_format),
+            duration_seconds=_estimate_duration(text)
         )
     
     async def get_available_voices(self) -> List[Dict[str, Any]]:
         """Get list of available voices with fallback"""
-        if self._mock_mode or not self._initialized or self.client is None:
+        if self._use_mock:
             return self._get_mock_voices()
             
+        if self._voices_cache is not None and time.monotonic() < self._voices_cache_expiry:
+            return list(self._voices_cache)
+        
         try:
-            # Create type-safe client reference
-            client = self.client
-            assert client is not None, "Client should not be None here"
-            
-            def list_voices_call():
-                return client.list_voices()
-            
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, list_voices_call)  # type: ignore[arg-type]
-            
-            voices = []
-            for voice in response.voices:
-                voices.append({
-                    "name": voice.name,
-                    "language_codes": list(voice.language_codes),
-                    "ssml_gender": voice.ssml_gender.name,
-                    "natural_sample_rate_hertz": voice.natural_sample_rate_hertz,
-                })
-            
-            return voices
+            async with self._voices_lock:
+                # Another caller may have refreshed the cache while we waited
+                if self._voices_cache is None or time.monotonic() >= self._voices_cache_expiry:
+                    # Create type-safe client reference
+                    client = self.client
+                    assert client is not None, "Client should not be None here"
+                    
+                    def list_voices_call():
+                        return client.list_voices()
+                    
+                    loop = asyncio.get_event_loop()
+                    response = await loop.run_in_executor(voice_executor, list_voices_call)  # type: ignore[arg-type]
+                    
+                    voices = []
+                    for voice in response.voices:
+                        voices.append({
+                            "name": voice.name,
+                            "language_codes": list(voice.language_codes),
+                            "ssml_gender": voice.ssml_gender.name,
+                            "natural_sample_rate_hertz": voice.natural_sample_rate_hertz,
+                        })
+                    
+                    self._voices_cache = voices
+                    self._voices_cache_expiry = time.monotonic() + _VOICES_CACHE_TTL
+                
+                return list(self._voices_cache)
             
         except Exception as e:
             logger.error(f"Failed to get available voices: {e}")
@@ -269,21 +514,15 @@ class TTSService:
     
     def _get_google_audio_encoding(self, format: str):
         """Get Google Cloud audio encoding from format string"""
-        if gcloud_tts is None:
-            return None
-            
-        format_map = {
-            "mp3": gcloud_tts.AudioEncoding.MP3,
-            "wav": gcloud_tts.AudioEncoding.LINEAR16,
-            "ogg": gcloud_tts.AudioEncoding.OGG_OPUS,
-        }
-        return format_map.get(format.lower(), gcloud_tts.AudioEncoding.MP3)
+        encoding = _GOOGLE_AUDIO_ENCODINGS.get(format)
+        if encoding is None:
+            encoding = _GOOGLE_AUDIO_ENCODINGS.get(format.lower(), _DEFAULT_GOOGLE_AUDIO_ENCODING)
+        return encoding
     
-    def _get_content_type(self, format: str) -> str:
-        """Get content type from format string"""
-        content_types = {
-            "mp3": "audio/mpeg",
-            "wav": "audio/wav",
-            "ogg": "audio/ogg",
-        }
-        return content_types.get(format.lower(), "audio/mpeg") 
\ No newline at end of file
+    def get_content_type(self, format: str) -> str:
+        """Get the HTTP content type for an output format string"""
+        # Formats almost always arrive lowercase already; only lower on a miss
+        content_type = _CONTENT_TYPES.get(format)
+        if content_type is None:
+            content_type = _CONTENT_TYPES.get(format.lower(), "audio/mpeg")
+        return content_type 
\ No newline at end of file
@@ -4,9 +4,10 @@ Voice processor that combines STT, AI, and TTS services
 
 import asyncio
 import logging
+import re
 import time
 import uuid
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
 
 from app.core.exceptions import VoiceProcessingError
 from app.models.schemas.voice import VoiceCommandRequest, VoiceCommandResponse, STTRequest, TTSRequest
@@ -14,22 +15,108 @@ from app.services.voice.stt_service import STTService
 from app.services.voice.tts_service import TTSService
 from app.services.ai.gemini_service import GeminiService
 
+try:
+    # SIMD base64 (AVX2/NEON) when available
+    from pybase64 import b64decode as _b64decode, b64encode as _b64encode
+except ImportError:
+    from base64 import b64decode as _b64decode, b64encode as _b64encode
+
 logger = logging.getLogger(__name__)
 
+# Where a streamed AI response can be cut and handed to TTS early
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Shorter fragments wait for the next sentence rather than costing a TTS call
+_MIN_TTS_SEGMENT_CHARS = 40
+
 
 class VoiceProcessor:
     """Main voice processor combining STT, AI, and TTS"""
     
-    def __init__(self):
-        """Initialize voice processor"""
-        self.stt_service = STTService()
-        self.tts_service = TTSService()
-        self.gemini_service = GeminiService()
+    def __init__(self, stt_service: Optional[STTService] = None,
+                 tts_service: Optional[TTSService] = None,
+                 gemini_service: Optional[GeminiService] = None):
+        """Initialize voice processor, reusing any services passed in"""
+        self.stt_service = stt_service or STTService()
+        self.tts_service = tts_service or TTSService()
+        self.gemini_service = gemini_service or GeminiService()
         logger.info("Voice processor initialized")
     
+    def _start_tts(self, text: str) -> asyncio.Task:
+        """Start synthesizing one segment of the response in the background"""
+        tts_request = TTSRequest(
+            text=text,
+            voice_name=None,
+            speaking_rate=None,
+            pitch=None,
+            volume_gain_db=None,
+            output_format="mp3"
+        )
+        return asyncio.create_task(self.tts_service.synthesize_speech(tts_request))
+    
+    async def _respond_with_speech(self, transcript: str, user_id: str, session_id: str,
+                                   context: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        """Stream the AI response and synthesize it sentence by sentence
+        
+        Each complete sentence goes to TTS while Gemini is still generating the
+        rest, so speech synthesis overlaps generation instead of following it.
+        Returns the full response text and the base64 MP3 audio.
+        """
+        tts_tasks: List[asyncio.Task] = []
+        parts: List[str] = []
+        pending = ""
+        
+        try:
+            async for chunk in self.gemini_service.generate_response_stream(
+                user_input=transcript,
+                user_id=user_id,
+                session_id=session_id,
+                context=context
+            ):
+                parts.append(chunk)
+                pending += chunk
+                
+                # Hand every finished sentence run to TTS, keep the unfinished tail
+                pieces = _SENTENCE_END.split(pending)
+                ready = " ".join(pieces[:-1])
+                if len(ready) >= _MIN_TTS_SEGMENT_CHARS:
+                    tts_tasks.append(self._start_tts(ready))
+                    pending = pieces[-1]
+            
+            if pending.strip():
+                tts_tasks.append(self._start_tts(pending))
+            
+            tts_responses = await asyncio.gather(*tts_tasks)
+            
+        except BaseException:
+            for task in tts_tasks:
+                task.cancel()
+            raise
+        
+        ai_response = "".join(parts)
+        
+        if not tts_responses:
+            logger.warning(f"AI returned an empty response for session {session_id}")
+            raise VoiceProcessingError("AI returned an empty response")
+        
+        if len(tts_responses) == 1:
+            audio_data = tts_responses[0].audio_data
+        elif any(self.tts_service.is_fallback(r) for r in tts_responses):
+            # Fallback silence is not MP3 frames and cannot be spliced between
+            # real segments; speak the whole response in one call instead
+            logger.warning("TTS fell back for a response segment; re-synthesizing the full response")
+            audio_data = (await self._start_tts(ai_response)).audio_data
+        else:
+            # MP3 is a frame stream, so segments concatenate into one playable file
+            audio_data = _b64encode(
+                b"".join(_b64decode(r.audio_data) for r in tts_responses)
+            ).decode('ascii')
+        
+        return ai_response, audio_data
+    
     async def process_voice_command(self, request: VoiceCommandRequest, user_id: str) -> VoiceCommandResponse:
         """Process complete voice command pipeline"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         session_id = request.session_id or str(uuid.uuid4())
         
         try:
@@ -50,35 +137,20 @@ class VoiceProcessor:
             
             logger.info(f"Transcribed: {transcript}")
             
-            # Step 2: AI Processing
-            ai_response = await self.gemini_service.generate_response(
-                user_input=transcript,
-                user_id=user_id,
-                session_id=session_id,
-                context=request.context
+            # Steps 2 and 3: AI processing, pipelined into Text-to-Speech
+            ai_response, audio_response = await self._respond_with_speech(
+                transcript, user_id, session_id, request.context
             )
             
             logger.info(f"AI response: {ai_response[:100]}...")
             
-            # Step 3: Text-to-Speech
-            tts_request = TTSRequest(
-                text=ai_response,
-                voice_name=None,
-                speaking_rate=None,
-                pitch=None,
-                volume_gain_db=None,
-                output_format="mp3"
-            )
-            
-            tts_response = await self.tts_service.synthesize_speech(tts_request)
-            
             # Calculate processing time
-            processing_time = int((time.time() - start_time) * 1000)
+            processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             return VoiceCommandResponse(
                 transcript=transcript,
                 ai_response=ai_response,
-                audio_response=tts_response.audio_data,
+                audio_response=audio_response,
                 session_id=session_id,
                 confidence=stt_response.confidence,
                 processing_time_ms=processing_time
@@ -88,15 +160,18 @@ class VoiceProcessor:
             logger.error(f"Voice command processing failed: {e}")
             raise VoiceProcessingError(f"Voice processing failed: {e}")
     
-    async def process_streaming_voice(self, audio_chunks: list, user_id: str, 
+    async def process_streaming_voice(self, audio_chunks: Union[Iterable[bytes], AsyncIterator[bytes]],
+                                    user_id: str, 
                                     session_id: Optional[str] = None) -> VoiceCommandResponse:
         """Process streaming voice input"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         session_id = session_id or str(uuid.uuid4())
         
         try:
-            # Process streaming audio
-            transcripts = await self.stt_service.transcribe_streaming(audio_chunks)
+            # Process streaming audio; recognition runs while chunks are still arriving
+            transcripts = [
+                transcript async for transcript in self.stt_service.transcribe_streaming(audio_chunks)
+            ]
             
             if not transcripts:
                 raise VoiceProcessingError("No speech detected in audio stream")
@@ -105,31 +180,17 @@ class VoiceProcessor:
             full_transcript = " ".join(transcripts)
             logger.info(f"Streaming transcribed: {full_transcript}")
             
-            # Process with AI
-            ai_response = await self.gemini_service.generate_response(
-                user_input=full_transcript,
-                user_id=user_id,
-                session_id=session_id
-            )
-            
-            # Convert to speech
-            tts_request = TTSRequest(
-                text=ai_response,
-                voice_name=None,
-                speaking_rate=None,
-                pitch=None,
-                volume_gain_db=None,
-                output_format="mp3"
+            # Process with AI, converting to speech as sentences arrive
+            ai_response, audio_response = await self._respond_with_speech(
+                full_transcript, user_id, session_id
             )
             
-            tts_response = await self.tts_service.synthesize_speech(tts_request)
-            
-            processing_time = int((time.time() - start_time) * 1000)
+            processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             return VoiceCommandResponse(
                 transcript=full_transcript,
                 ai_response=ai_response,
-                audio_response=tts_response.audio_data,
+                audio_response=audio_response,
                 session_id=session_id,
                 confidence=0.95,  # Approximate for streaming
                 processing_time_ms=processing_time
@@ -0,0 +1,39 @@
+"""
+Tests for script security validation in the task execution engine
+"""
+
+import pytest
+
+from app.services.tasks.execution_engine import (
+    SecurityLevel,
+    SecurityViolationError,
+    TaskExecutor,
+)
+
+
+@pytest.fixture
+def executor():
+    return TaskExecutor()
+
+
+@pytest.mark.parametrize("script", [
+    'import json\njson.codecs.open("/etc/passwd")',
+    'import pathlib\npathlib.Path("/etc/passwd").open()',
+    'f = json.codecs.open\nf("/etc/passwd")',
+])
+def test_restricted_builtin_reached_through_attribute_is_rejected(executor, script):
+    with pytest.raises(SecurityViolationError):
+        executor._validate_security(script, SecurityLevel.RESTRICTED)
+
+
+def test_restricted_builtin_called_by_name_is_rejected(executor):
+    with pytest.raises(SecurityViolationError):
+        executor._validate_security('open("/etc/passwd")', SecurityLevel.RESTRICTED)
+
+
+@pytest.mark.parametrize("script", [
+    'file = 3',
+    'input = "hello"\nprint(len("x"))',
+])
+def test_assigning_builtin_name_is_allowed(executor, script):
+    executor._validate_security(script, SecurityLevel.RESTRICTED)